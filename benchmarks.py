@@ -0,0 +1,364 @@
+#-------------------------------------------------------------------------------
+# Name:        benchmarks.py
+# Purpose:     Times parts of the game with no window or sound.
+#              Run with the names of the benchmarks to run, or none
+#              to run them all, e.g. python benchmarks.py enemies
+#
+# Author:      Will Taplin
+#
+# Created:     13/12/2011
+# Copyright:   (c) Owner 2011
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+import os
+import sys
+import time
+import random
+
+# no window or sound needed
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import engine
+import game
+import states
+import sprite_manager
+import bullets
+import levels
+import level_generator
+
+class Viewport():
+    """ Stands in for engine.graphics.Viewport, parked at the
+    start of the level so nothing spawns from the enemy queue """
+    level_pos = 0
+    width = 0
+
+def time_frames(step, frames):
+    # return the average time of step in microseconds
+    start = time.time()
+    for frame in xrange(frames):
+        step(frame)
+    return (time.time() - start) / frames * 1000000
+
+def bench_enemies(new_game, frames = 200):
+    # time SpriteManager.update with a steady number of enemies that
+    # move in straight lines and sine waves, some shooting, with the
+    # enemies moved by their own update methods and together by the
+    # motion batch
+    types = ['enemy_01', 'enemy_03', 'enemy_05', 'enemy_06',
+             'enemy_08', 'enemy_09', 'enemy_10', 'enemy_11']
+    viewport = Viewport()
+    player_rect = new_game.player.rect
+
+    def run(count, batched):
+        random.seed(1)
+        manager = sprite_manager.SpriteManager(new_game)
+        if batched:
+            manager.motion_batch_min = 0
+        else:
+            manager.motion_batch = None
+        enemies = manager.sprites['enemy_group']
+
+        def step(frame):
+            # replace enemies that left the screen
+            batch = []
+            while len(enemies) + len(batch) < count:
+                batch.append(manager.create_enemy(new_game,
+                                                  random.choice(types), 0,
+                                                  random.randint(60, 200),
+                                                  False))
+            if batch:
+                manager.spawn_batch(batch, frame * 16)
+            manager.update(frame * 16, viewport, player_rect)
+
+        return time_frames(step, frames)
+
+    print 'enemy update, microseconds per frame'
+    print '%8s %10s %10s' % ('enemies', 'update()', 'batched')
+    for count in (10, 20, 30, 40, 50, 100, 500, 1000):
+        own = run(count, False)
+        if engine.motion.numpy is not None:
+            batched = '%10.0f' % run(count, True)
+        else:
+            batched = '%10s' % 'no numpy'
+        print '%8d %10.0f %s' % (count, own, batched)
+
+def bench_bullets(new_game, frames = 200):
+    # time SpriteManager update, collisions and draw on the boss
+    # screen with 8 enemies and a steady number of enemy bullets,
+    # with the bullets as sprites and in the bullet engine
+    viewport = Viewport()
+    screen = new_game.display.get_screen()
+    image = new_game.image_manager.get_image('eshot')
+    player = new_game.player
+    player.protected = True
+    player.explode_time = 0
+    player.protect_duration = 1000000000
+    new_game.current_level = 6
+    new_game.boss_level = True
+
+    def run(count, use_engine):
+        random.seed(2)
+        manager = sprite_manager.SpriteManager(new_game)
+        if use_engine:
+            manager.bullet_engine_min = 0
+        else:
+            manager.bullet_engine = None
+        manager.add_sprite(player, 'player_group')
+        for number in xrange(8):
+            manager.add_sprite(manager.create_enemy(new_game, 'enemy_05',
+                                                    200 + number * 10,
+                                                    60 + number * 15, False),
+                               'enemy_group')
+
+        def step(frame):
+            # replace the bullets that left the screen
+            while manager.get_count('enemy_shots') < count:
+                manager.add_sprite(bullets.EnemyBulletAngle.create(
+                                       random.randint(40, 280),
+                                       random.randint(60, 200),
+                                       random.uniform(0, 6.28), 20, image),
+                                   'enemy_shots')
+            manager.update(frame * 16, viewport, player.rect)
+            manager.check_collisions(player)
+            manager.draw(screen)
+
+        return time_frames(step, frames)
+
+    print 'bullets on the boss screen, microseconds per frame'
+    print '%8s %10s %10s' % ('bullets', 'sprites', 'engine')
+    for count in (10, 20, 40, 60, 100, 300, 1000):
+        own = run(count, False)
+        if engine.projectiles.numpy is not None:
+            batched = '%10.0f' % run(count, True)
+        else:
+            batched = '%10s' % 'no numpy'
+        print '%8d %10.0f %s' % (count, own, batched)
+    new_game.current_level = 1
+    new_game.boss_level = False
+    new_game.reset_player()
+
+def bench_steps(new_game, steps = 6000):
+    # time whole GameState steps, update and draw, on each shipped
+    # level, holding fire and weaving up and down with the player
+    # unable to die. Runs with sprites only, with the bullet engine
+    # and motion batch always on, and with the game's defaults
+    screen = new_game.display.get_screen()
+    fire = 1 << engine.system.BUTTONS.index('B')
+    weave = (1 << engine.system.BUTTONS.index('UP'),
+             1 << engine.system.BUTTONS.index('DOWN'))
+
+    def run(level, setup):
+        random.seed(1)
+        new_game.current_level = level
+        new_game.reset_player()
+        state = states.GameState(new_game)
+        new_game.change_state(state)
+        setup(state.sprite_manager)
+        player = new_game.player
+        update_time = 0.0
+        draw_time = 0.0
+        for step in xrange(steps):
+            engine.system.CLOCK.ticks = int(step * engine.system.TIMESTEP *
+                                            1000)
+            player.protected = True
+            player.explode_time = engine.system.CLOCK.ticks
+            player.protect_duration = 1000000000
+            new_game.input_manager.set_state(fire | weave[step // 90 % 2], 0)
+            start = time.time()
+            state.handle_input()
+            state.update()
+            update_time += time.time() - start
+            start = time.time()
+            state.draw(screen)
+            draw_time += time.time() - start
+            # stop at the end of the level
+            if new_game.get_current_state() is not state:
+                break
+        new_game.input_manager.set_state(None, 0)
+        step += 1
+        return (step, update_time / step * 1000000,
+                draw_time / step * 1000000, player.score)
+
+    def sprites_only(manager):
+        manager.bullet_engine = None
+        manager.motion_batch = None
+
+    def numpy_always(manager):
+        manager.bullet_engine_min = 0
+        manager.motion_batch_min = 0
+
+    def defaults(manager):
+        pass
+
+    setups = [('sprites', sprites_only)]
+    if engine.projectiles.numpy is not None:
+        setups.extend([('numpy', numpy_always), ('default', defaults)])
+    print 'GameState steps, microseconds per step'
+    print '%6s %8s %6s %8s %8s %8s' % ('level', 'run', 'steps',
+                                       'update', 'draw', 'score')
+    for level in xrange(1, 7):
+        for name, setup in setups:
+            print '%6d %8s %6d %8.0f %8.0f %8d' % ((level, name) +
+                                                   run(level, setup))
+    new_game.current_level = 1
+    new_game.reset_player()
+
+def bench_collisions(new_game, frames = 200):
+    # time SpriteManager.check_collisions with 50 enemies and 100 player
+    # shots that are sprites, spread over the screen, with and without
+    # the shot grid. Counts the shot to hitbox tests each needs
+    enemy_count = 50
+    shot_count = 100
+    image = new_game.image_manager.get_image('pshot')
+    player = new_game.player
+    player.protected = True
+    player.explode_time = 0
+    player.protect_duration = 1000000000
+
+    def run(use_grid):
+        random.seed(1)
+        manager = sprite_manager.SpriteManager(new_game)
+        manager.bullet_engine = None
+        if not use_grid:
+            manager.shot_grid = None
+        manager.add_sprite(player, 'player_group')
+        enemies = manager.sprites['enemy_group']
+        shots = manager.sprites['player_shots']
+        tests = 0
+        elapsed = 0.0
+        for frame in xrange(frames):
+            # replace the enemies and shots that were destroyed
+            while len(enemies) < enemy_count:
+                manager.add_sprite(manager.create_enemy(new_game, 'enemy_01',
+                                       random.randint(0, 300),
+                                       random.randint(30, 220), False),
+                                   'enemy_group')
+            while len(shots) < shot_count:
+                manager.add_sprite(bullets.BasicBullet.create(
+                                       random.randint(0, 310),
+                                       random.randint(30, 230), 0, image),
+                                   'player_shots')
+            # count the tests the shot to enemy pass makes
+            if use_grid:
+                grid = engine.collision.SpatialHash(engine.system.SCREEN_RECT)
+                for bullet in shots:
+                    grid.insert(bullet.hitbox)
+                for enemy in enemies:
+                    tests += len(grid.query(enemy.hitbox)) * len(enemy.hitbox)
+            else:
+                for enemy in enemies:
+                    tests += len(shots) * len(enemy.hitbox)
+            start = time.time()
+            manager.check_collisions(player)
+            elapsed += time.time() - start
+        return tests / frames, elapsed / frames * 1000000
+
+    print '%d enemies x %d shots, per frame' % (enemy_count, shot_count)
+    print '%10s %10s %14s' % ('', 'tests', 'microseconds')
+    for name, use_grid in (('all pairs', False), ('grid', True)):
+        tests, elapsed = run(use_grid)
+        print '%10s %10d %14.0f' % (name, tests, elapsed)
+
+def index_read_level(lines):
+    # the level parser load_level used before levels.read_level,
+    # kept to compare against. Looks up each word's value with
+    # list.index, so each record is scanned once per word
+    table = levels.SpawnTable()
+    enemy_data = []
+    for line in lines:
+        for word in line.split():
+            enemy_data.append(word)
+        for element in enemy_data:
+            next_index = enemy_data.index(element) + 1
+            if element == 'type':
+                enemy_type = enemy_data[next_index]
+            elif element == 'x':
+                x = int(enemy_data[next_index])
+            elif element == 'y':
+                y = int(enemy_data[next_index])
+            elif element == 'has_powerup':
+                has_powerup = enemy_data[next_index] == 'True'
+            elif element == 'end_enemy':
+                table.add(enemy_type, x, y, has_powerup)
+                enemy_data = []
+    return table
+
+def bench_levels(new_game, repeats = 20):
+    # time parsing the game's levels and a large synthetic level,
+    # with levels.read_level and the parser it replaced
+    files = []
+    for number in xrange(1, 7):
+        filename = 'level_%d.txt' % number
+        level = open(os.path.join('res', 'levels', filename), 'r')
+        files.append((filename, level.readlines(), repeats))
+        level.close()
+    spawns = level_generator.generate_level(count = 50000, length = 200000)
+    files.append(('synthetic',
+                  [level_generator.format_spawn(spawn) for spawn in spawns], 1))
+
+    def run(parse, lines, times):
+        start = time.time()
+        for time_number in xrange(times):
+            table = parse(lines)
+        return table, (time.time() - start) / times * 1000
+
+    print 'level parsing, milliseconds per level'
+    print '%12s %8s %10s %12s' % ('level', 'spawns', 'index()', 'read_level')
+    for filename, lines, times in files:
+        old, old_time = run(index_read_level, lines, times)
+        new, new_time = run(levels.read_level, lines, times)
+        for index in xrange(len(new)):
+            assert old.get(index) == new.get(index)
+        print '%12s %8d %10.2f %12.2f' % (filename, len(new),
+                                         old_time, new_time)
+
+def bench_snapshots(new_game, steps = 3000, every = 500, repeats = 20):
+    # time capturing and restoring the simulation every few hundred
+    # steps of level 1, with no input, against the sprites and bullets
+    # alive and the size of the snapshot
+    random.seed(1)
+    new_game.current_level = 1
+    new_game.change_state(states.GameState(new_game))
+    state = new_game.get_current_state()
+    manager = state.sprite_manager
+
+    print 'snapshots of level 1, milliseconds'
+    print '%6s %8s %8s %8s %8s' % ('step', 'objects', 'bytes',
+                                   'capture', 'restore')
+    for step in xrange(1, steps + 1):
+        engine.system.CLOCK.ticks = int(step * engine.system.TIMESTEP * 1000)
+        state.update()
+        if step % every:
+            continue
+        count = sum(manager.get_count(group) for group in manager.sprites)
+        start = time.time()
+        for repeat in xrange(repeats):
+            snapshot = state.capture()
+        capture_time = (time.time() - start) / repeats * 1000
+        start = time.time()
+        for repeat in xrange(repeats):
+            new_game.snapshots.restore(snapshot, state)
+        restore_time = (time.time() - start) / repeats * 1000
+        manager = state.sprite_manager
+        print '%6d %8d %8d %8.3f %8.3f' % (step, count, len(snapshot),
+                                           capture_time, restore_time)
+
+BENCHMARKS = [('enemies', bench_enemies),
+              ('bullets', bench_bullets),
+              ('steps', bench_steps),
+              ('collisions', bench_collisions),
+              ('levels', bench_levels),
+              ('snapshots', bench_snapshots)]
+
+def main():
+    names = sys.argv[1:]
+    new_game = game.PsmGame()
+    for name, benchmark in BENCHMARKS:
+        if not names or name in names:
+            benchmark(new_game)
+            print
+
+if __name__ == '__main__':
+    main()
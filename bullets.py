@@ -20,12 +20,35 @@ from engine.system import SCREEN_RECT
 LAST_LEVEL_SCREEN_RECT = pygame.rect.Rect(0,64,320,144)
 BOSS_LEVEL_SCREEN_RECT = pygame.rect.Rect(16,48,288,176)
 
-class Bullet(pygame.sprite.Sprite):
-    """ Abstract class for a bullet """
-    def __init__(self, x, y, angle, image):
+def get_level_bounds(game):
+    # return the screen area bullets live in for the current level
+    if game.current_level == 6:
+        if game.boss_level:
+            return BOSS_LEVEL_SCREEN_RECT
+        else:
+            return LAST_LEVEL_SCREEN_RECT
+    return SCREEN_RECT
+
+class Bullet(engine.objects.PooledSprite, pygame.sprite.Sprite):
+    """ Abstract class for a bullet. Bullets are recycled through
+    pools, get one with create() and set it up in reset().
+    cull and follow_bounds tell engine.projectiles.BulletEngine
+    when the bullet leaves the screen. Subclasses name the
+    collision layer they collide on """
+    cull = engine.projectiles.CULL_OUTSIDE
+    follow_bounds = True # use the level's bounds, not SCREEN_RECT
+    collision_layer = None
+    wake_time = -1 # always updated
+    def __init__(self, *args):
         pygame.sprite.Sprite.__init__(self)
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.hitbox = pygame.Rect(0, 0, 0, 0)
+        self.reset(*args)
+
+    def reset(self, x, y, angle, image):
+        # (re)initialize the bullet at x, y
         self.image = image
-        self.rect = self.image.get_rect()
+        self.rect.size = self.image.get_size()
         self.rect.left = x
         self.rect.centery = y
         self.dx = self.rect.x
@@ -33,29 +56,46 @@ class Bullet(pygame.sprite.Sprite):
         self.speed = 0
         self.angle = angle
         self.bounds = SCREEN_RECT
-        self.hitbox = pygame.Rect(self.dx, self.dy, 0, 0)
         self.hb_offsetx = 0
         self.hb_offsety = 0
+        self.set_hitbox(0, 0)
         self.destroyable = True
 
+    def set_hitbox(self, width, height):
+        # size the hitbox and move it to the bullet's offsets
+        self.hitbox.x = self.dx + self.hb_offsetx
+        self.hitbox.y = self.dy + self.hb_offsety
+        self.hitbox.width = width
+        self.hitbox.height = height
+
+    def get_velocity(self):
+        # pixels/sec moved along x and y
+        return (math.cos(self.radians) * self.speed,
+                math.sin(self.radians) * self.speed)
+
+    def get_hitbox_offset(self):
+        # hitbox pos relative to the rect after each move
+        return self.hb_offsetx, self.hb_offsety
+
     def update(self, *args):
-        game = args[2]
-        if game.current_level == 6:
-            if game.boss_level:
-                self.bounds = BOSS_LEVEL_SCREEN_RECT
-            else:
-                self.bounds = LAST_LEVEL_SCREEN_RECT
+        self.bounds = get_level_bounds(args[2])
 
 class BasicBullet(Bullet):
     """ Player bullet class, sub-class of Bullet
     Object moves horizontally from left to right for the duration
     it is on screen """
-    def __init__(self, x, y, angle, image):
-        Bullet.__init__(self, x, y, angle, image)
+    cull = engine.projectiles.CULL_RIGHT
+    collision_layer = 'player_shots'
+    follow_bounds = False
+
+    def reset(self, x, y, angle, image):
+        Bullet.reset(self, x, y, angle, image)
         self.speed = 400
         self.hb_offsety = 2
-        self.hitbox = pygame.Rect(self.dx + self.hb_offsetx,
-                                  self.dy + self.hb_offsety, 8, 4)
+        self.set_hitbox(8, 4)
+
+    def get_velocity(self):
+        return self.speed, 0
      
     def update(self, *args):
         # move bullet at self.speed pixels/sec
@@ -74,13 +114,18 @@ class EnemyBullet(Bullet):
     """ Enemy bullet class, sub-class of Bullet.
     Object moves horizontally from right to left for the duration
     it is on screen """
-    def __init__(self, x, y, angle, image):
-        Bullet.__init__(self, x, y, angle, image)
+    cull = engine.projectiles.CULL_LEFT
+    collision_layer = 'enemy_shots'
+
+    def reset(self, x, y, angle, image):
+        Bullet.reset(self, x, y, angle, image)
         self.speed = 100
         self.hb_offsetx = 1
         self.hb_offsety = 1
-        self.hitbox = pygame.Rect(self.dx + self.hb_offsetx,
-                                  self.dy + self.hb_offsety, 6, 6)
+        self.set_hitbox(6, 6)
+
+    def get_velocity(self):
+        return -self.speed, 0
    
     def update(self, *args):
         Bullet.update(self, *args)
@@ -98,14 +143,15 @@ class EnemyBullet(Bullet):
 
 class EnemyBulletAngle(Bullet):
     """ Enemy bullets that travel at an angle """
-    def __init__(self, x, y, angle, speed, image):
-        Bullet.__init__(self, x, y, angle, image)
+    collision_layer = 'enemy_shots'
+
+    def reset(self, x, y, angle, speed, image):
+        Bullet.reset(self, x, y, angle, image)
         self.speed = speed
         self.radians = angle
         self.hb_offsetx = 1
         self.hb_offsety = 1
-        self.hitbox = pygame.Rect(self.dx + self.hb_offsetx,
-                                  self.dy + self.hb_offsety, 6, 6)
+        self.set_hitbox(6, 6)
 
     def update(self, *args):
         #call Bullet update for last level screen bounds
@@ -128,14 +174,15 @@ class EnemyBulletAngle(Bullet):
 
 class SpreaderBullet(Bullet):
     """ bullet for the spreader gun, can travel at an angle """
-    def __init__(self, x, y, angle, image):
-        Bullet.__init__(self, x, y, angle, image)
+    collision_layer = 'player_shots'
+
+    def reset(self, x, y, angle, image):
+        Bullet.reset(self, x, y, angle, image)
         self.speed = 300
         self.radians = -self.angle * math.pi / 180
         self.hb_offsetx = 1
         self.hb_offsety = 1
-        self.hitbox = pygame.Rect(self.dx + self.hb_offsetx,
-                                  self.dy + self.hb_offsety, 6, 6)
+        self.set_hitbox(6, 6)
       
     def update(self, *args):
         #call Bullet update for last level screen bounds
@@ -157,19 +204,39 @@ class SpreaderBullet(Bullet):
 
 class ReverseFireBullet(SpreaderBullet):
     """ Bullet for reverse shot gun, can travel at an angle """
+    rotated_images = dict() # (image, angle) : rotated image
 
-    def __init__(self, x, y, angle, image):
-        SpreaderBullet.__init__(self, x, y, angle, image)
+    def reset(self, x, y, angle, image):
+        SpreaderBullet.reset(self, x, y, angle, image)
         self.speed = 400
         self.hb_offsetx = 0
         self.hb_offsety = 2
-        self.hitbox = pygame.Rect(self.dx + self.hb_offsetx,
-                                  self.dy + self.hb_offsety, 8, 4)
+        self.set_hitbox(8, 4)
         self.center = self.rect.center
-        self.image = pygame.transform.rotate(self.image, angle)
-        self.rect = self.image.get_rect()
+        self.image = self.get_rotated(image, angle)
+        self.rect.size = self.image.get_size()
         self.rect.center = self.center
 
+    @classmethod
+    def get_rotated(cls, image, angle):
+        # rotate each image once per angle
+        key = (image, angle)
+        if key not in cls.rotated_images:
+            cls.rotated_images[key] = pygame.transform.rotate(image, angle)
+        return cls.rotated_images[key]
+
+    @classmethod
+    def prepare(cls, image_manager, image, angles):
+        # rotate image to each of angles and cache the masks of the
+        # rotated images, so pixel collisions can test them
+        image_manager.add_masks([cls.get_rotated(image, angle)
+                                 for angle in angles])
+
+    def get_hitbox_offset(self):
+        if self.angle == 220:
+            return self.hb_offsetx, self.hb_offsety + 3
+        return self.hb_offsetx, self.hb_offsety
+
     def update(self, *args):
         SpreaderBullet.update(self, *args)
 
@@ -179,6 +246,8 @@ class ReverseFireBullet(SpreaderBullet):
 class LaserBeam(pygame.sprite.Sprite):
     """ Laser Beam bullet - an expanding shot that stays attached to the
         player and lasts for self.duration before disapearing """
+    collision_layer = 'player_shots'
+    wake_time = -1 # always updated
 
     def __init__(self, x, y):
         pygame.sprite.Sprite.__init__(self)
@@ -192,7 +261,7 @@ class LaserBeam(pygame.sprite.Sprite):
         self.speed = 1000
         self.duration = 650
         self.destroyable = False
-        self.shot_time = pygame.time.get_ticks()
+        self.shot_time = engine.system.get_ticks()
         
 
     def update(self, *args):
@@ -222,12 +291,28 @@ class LaserBeam(pygame.sprite.Sprite):
         if current_time - self.shot_time > self.duration:
             self.kill()
 
-class Explosion(engine.objects.AnimatedSprite):
+class Explosion(engine.objects.PooledSprite, engine.objects.AnimatedSprite):
     """ Explosion animation """
+    collision_layer = None # only for show, never collides
 
     def __init__(self, x, y, images):
         engine.objects.AnimatedSprite.__init__(self,x,y,images)
         self.hitbox = None
+        # nothing happens between frames
+        self.wake_time = self.last_update + self.delay
+
+    def reset(self, x, y, images):
+        # restart the animation at x, y
+        self.images = images
+        self.image = self.images[0]
+        self.frame = 0
+        self.last_update = 0
+        self.rect.size = self.image.get_size()
+        self.rect.x = x
+        self.rect.y = y
+        self.dx = self.rect.x
+        self.dy = self.rect.y
+        self.wake_time = self.last_update + self.delay
 
     def update(self, *args):
         current_time = args[0]
@@ -239,17 +324,19 @@ class Explosion(engine.objects.AnimatedSprite):
                 self.kill()
             self.image = self.images[self.frame]
             self.last_update = current_time
+            self.wake_time = self.last_update + self.delay
 
 class Shrapnel(Bullet):
     """ Shrapnel object """
-    def __init__(self, x, y, angle, images):
-        Bullet.__init__(self, x, y, angle, images[0])
+    collision_layer = 'shrapnel'
+
+    def reset(self, x, y, angle, images):
+        Bullet.reset(self, x, y, angle, images[0])
         self.image = images[angle / 45]
         self.radians = -self.angle * math.pi / 180  
         self.hb_offsetx = 1
         self.hb_offsety = 1
-        self.hitbox = pygame.Rect(self.dx + self.hb_offsetx,
-                                  self.dy + self.hb_offsety, 6, 6)
+        self.set_hitbox(6, 6)
         self.speed = 35
 
     def update(self, *args):
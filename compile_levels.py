@@ -0,0 +1,76 @@
+#-------------------------------------------------------------------------------
+# Name:        compile_levels.py
+# Purpose:     Compiles the level files in res/levels to their binary
+#              caches, several at once on Python 2.6 and later, and
+#              checks every enemy type they use is registered in
+#              enemies.ENEMY_TYPES.
+#              Run with the level files to compile, or none for all
+#              of them, e.g. python compile_levels.py level_1.txt
+#
+# Author:      Will Taplin
+#
+# Created:     16/12/2011
+# Copyright:   (c) Owner 2011
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+import os
+import sys
+import glob
+
+# multiprocessing is new in Python 2.6, without it the
+# levels are compiled one after another
+try:
+    import multiprocessing
+except ImportError:
+    multiprocessing = None
+
+import levels
+import enemies
+
+LEVEL_DIR = os.path.join('res', 'levels')
+
+def compile_file(filename):
+    # compile one level file, in a worker process when there are
+    # any. Returns (filename, spawn count, enemy types used, error
+    # message or None)
+    try:
+        table = levels.compile_level(filename)
+    except (IOError, OSError, levels.LevelError), message:
+        return filename, 0, [], str(message)
+    return filename, len(table), table.types, None
+
+def main():
+    filenames = [os.path.join(LEVEL_DIR, name) for name in sys.argv[1:]]
+    if not filenames:
+        filenames = sorted(glob.glob(os.path.join(LEVEL_DIR, '*.txt')))
+
+    if multiprocessing is not None:
+        pool = multiprocessing.Pool()
+        try:
+            results = pool.map(compile_file, filenames)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = map(compile_file, filenames)
+
+    failed = 0
+    for filename, count, types, error in results:
+        if error is None:
+            unknown = [enemy_type for enemy_type in types
+                       if enemy_type not in enemies.ENEMY_TYPES]
+            if unknown:
+                error = 'unknown enemy types: %s' % ', '.join(unknown)
+        if error is None:
+            print '%s: %d spawns -> %s' % (filename, count,
+                                          levels.get_cache_name(filename))
+        else:
+            print '%s: %s' % (filename, error)
+            failed += 1
+    if failed:
+        print failed, 'of', len(results), 'levels failed'
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -22,6 +22,12 @@ from engine.system import SCREEN_RECT
 class Enemy1(engine.objects.AnimatedSprite):
     """ First enemy type, moves in a straight line
     at a high speed """
+    collision_layer = 'enemies'
+    # moved by an engine.motion.MotionBatch instead of update() when
+    # numpy is available. Subclasses with other movement, or shooting
+    # other than one shot every shoot_speed m/s, set this False
+    batched = True
+
     def __init__(self, game, x, y, has_powerup, images, fps = 20):
         engine.objects.AnimatedSprite.__init__(self, x, y, images, fps)
         self.game = game
@@ -62,11 +68,20 @@ class Enemy1(engine.objects.AnimatedSprite):
         # to the edge of the screen.
         self.dx = self.bounds.right
 
+    def get_motion(self):
+        # (x speed, radius, dAngle, angle) for engine.motion.MotionBatch
+        return -self.speed, 0.0, 0.0, 0.0
+
+    def get_weapon(self):
+        # (shot delay, last shot, stop x) for engine.motion.MotionBatch,
+        # None for enemies that don't shoot on a timer
+        return None
+
     def drop_powerup(self):
         # drop a speed powerup if self.has_powerup
         if self.has_powerup:
-            powerup = powerups.PowerUp(self.game, self.rect.x, self.rect.y,
-                                        self.powerup_type)
+            powerup = powerups.PowerUp.create(self.game, self.rect.x,
+                                              self.rect.y, self.powerup_type)
         else:
             powerup = None
         return powerup
@@ -83,8 +98,8 @@ class Enemy1(engine.objects.AnimatedSprite):
 
         # create explosion sprite
         ex = []
-        anim = bullets.Explosion(self.rect.x, self.rect.y,
-                               self.game.image_manager.get_image('explosion'))
+        images = self.game.image_manager.get_image('explosion')
+        anim = bullets.Explosion.create(self.rect.x, self.rect.y, images)
         ex.append(anim)
         
         # get a powerup
@@ -95,6 +110,28 @@ class Enemy1(engine.objects.AnimatedSprite):
 
         return ex, powerup
 
+    def clone(self, x, y, has_powerup):
+        # return a new enemy of this type at x, y. Images, sounds
+        # and per type values are shared with this enemy, the rect
+        # and hitboxes are copied
+        enemy = self.__class__.__new__(self.__class__)
+        enemy.__dict__.update(self.__dict__)
+        pygame.sprite.Sprite.__init__(enemy)
+        enemy.rect = self.rect.copy()
+        enemy.hitbox = [box.copy() for box in self.hitbox]
+        enemy.has_powerup = has_powerup
+        enemy.place(x, y)
+        return enemy
+
+    def place(self, x, y):
+        # move the enemy and its hitbox to x, y
+        self.rect.x = x
+        self.rect.y = y
+        self.dx = self.rect.x
+        self.dy = self.rect.y
+        self.hitbox[0].x = self.rect.x + self.hb_offsetx
+        self.hitbox[0].y = self.rect.y + self.hb_offsety
+
     def get_flash_image(self):
         # create a white out image of sprite for hit animation
         flash_image = self.image.copy()
@@ -105,12 +142,15 @@ class Enemy1(engine.objects.AnimatedSprite):
                 if flash_image.get_at((x,y)) != (255,0,255):
                     flash_image.set_at((x,y), (255,255,255))
         flash_image.convert()
+        self.game.image_manager.add_masks([flash_image])
       
         return flash_image
 
 class Enemy2(Enemy1):
     """ Second enemy type, moves in a straight line
     at a slow speed and shoots """
+    batched = False
+
     def __init__(self, game, x, y, has_powerup, images):
         Enemy1.__init__(self, game, x, y, has_powerup, images)
         self.speed = 25
@@ -156,7 +196,7 @@ class Enemy2(Enemy1):
         # fire a shot at current pos, every
         # self.shoot_speed m/s, keep track of shots fired
         if current_time - self.last_shot > self.shoot_speed:
-            shot = bullets.EnemyBullet(self.rect.left,
+            shot = bullets.EnemyBullet.create(self.rect.left,
                              self.rect.centery, 0, self.bullet_image)
             self.shots += 1
             self.last_shot = current_time
@@ -180,6 +220,9 @@ class Enemy3(Enemy1):
         self.points = 175
         self.powerup_type = 0 # spreader
 
+    def get_motion(self):
+        return -self.speed, self.radius, self.dAngle, self.angle
+
     def update(self, *args):
         # call parent classes update method
         Enemy1.update(self, *args)
@@ -259,8 +302,9 @@ class Enemy4(Enemy2):
         # create explosion sprite
 
         for angle in range(0,360,45):
-            ex.append(bullets.Shrapnel(self.rect.centerx, self.rect.centery,
-                                       angle, self.explosion_image))
+            ex.append(bullets.Shrapnel.create(self.rect.centerx,
+                                              self.rect.centery, angle,
+                                              self.explosion_image))
 
         # play sound
         self.explosion_sound.play()
@@ -274,6 +318,7 @@ class Enemy4(Enemy2):
 
 class Enemy5(Enemy2):
     """ Large, multi-hit taking, enemy that creats shrapnel on explode """
+    batched = True
 
     def __init__(self, game, x, y, has_powerup, images):
         Enemy2.__init__(self, game, x, y, has_powerup, images)
@@ -303,20 +348,29 @@ class Enemy5(Enemy2):
         # fire a shot at current pos, every
         # self.shoot_speed m/s, keep track of shots fired
         if current_time - self.last_shot > self.shoot_speed:
-            shot = bullets.EnemyBullet(self.rect.left + 2,
-                             self.rect.centery + 5, 0, self.bullet_image)
+            shot = self.fire()
             self.last_shot = current_time
         else:
             shot = None
         return shot
 
+    def get_weapon(self):
+        return self.shoot_speed, self.last_shot, self.stop_shoot
+
+    def fire(self, *args):
+        # return a shot fired straight ahead from current pos
+        return bullets.EnemyBullet.create(self.rect.left + 2,
+                                          self.rect.centery + 5, 0,
+                                          self.bullet_image)
+
     def explode(self):
         ex = []
         # create explosion sprite
 
         for angle in range(0,360,45):
-            ex.append(bullets.Shrapnel(self.rect.centerx, self.rect.centery,
-                                       angle, self.explosion_image))
+            ex.append(bullets.Shrapnel.create(self.rect.centerx,
+                                              self.rect.centery, angle,
+                                              self.explosion_image))
 
         # play sound
         self.explosion_sound.play()
@@ -342,6 +396,8 @@ class Enemy6(Enemy3):
 
 class Enemy7(Enemy1):
     """ Homing enemy """
+    batched = False
+
     def __init__(self, game, x, y, has_powerup, images):
         Enemy1.__init__(self, game, x, y, has_powerup, images)
         self.speed = 95
@@ -396,6 +452,9 @@ class Enemy8(Enemy1):
         # to the edge of the screen.
         self.dx = self.bounds.left - self.rect.width
 
+    def get_motion(self):
+        return self.speed, 0.0, 0.0, 0.0
+
     def update(self, *args):
         current_time = args[0]
 
@@ -426,6 +485,9 @@ class Enemy9(Enemy3):
         # to the edge of the screen.
         self.dx = self.bounds.left - self.rect.width
 
+    def get_motion(self):
+        return self.speed, self.radius, self.dAngle, self.angle
+
     def update(self, *args):
         current_time = args[0]
         engine.objects.AnimatedSprite.update(self, current_time)
@@ -459,6 +521,7 @@ class Enemy10(Enemy9):
 
 class Enemy11(Enemy2):
     """ enemy that shoots single shots at the player """
+    batched = True
     def __init__(self, game, x, y, has_powerup, images):
         Enemy2.__init__(self, game, x, y, has_powerup, images)
         self.speed = 40
@@ -489,19 +552,26 @@ class Enemy11(Enemy2):
         # fire a shot at current pos, every
         # self.shoot_speed m/s, keep track of shots fired
         if current_time - self.last_shot > self.shoot_speed:
-            angle = math.atan2(player_rect.centery - self.rect.centery,
-                               player_rect.centerx - self.rect.centerx)
-
-            shot = bullets.EnemyBulletAngle(self.rect.left,
-                             self.rect.centery, angle, self.bullet_speed,
-                             self.bullet_image)
+            shot = self.fire(player_rect)
             self.last_shot = current_time
         else:
             shot = None
         return shot
 
+    def get_weapon(self):
+        return self.shoot_speed, self.last_shot, self.stop_shoot
+
+    def fire(self, player_rect):
+        # return a shot fired from current pos at the player
+        angle = math.atan2(player_rect.centery - self.rect.centery,
+                           player_rect.centerx - self.rect.centerx)
+        return bullets.EnemyBulletAngle.create(self.rect.left,
+                         self.rect.centery, angle, self.bullet_speed,
+                         self.bullet_image)
+
 class Enemy12(Enemy1):
     """ enemy that shifts up and down at intervals """
+    batched = False
 
     def __init__(self, game, x, y, has_powerup, images):
         Enemy1.__init__(self, game, x, y, has_powerup, images)
@@ -538,6 +608,15 @@ class Enemy12(Enemy1):
         self.rect.y = self.dy
         self.hitbox[0].y = self.rect.y + self.hb_offsety
 
+    def place(self, x, y):
+        Enemy1.place(self, x, y)
+
+        # shift direction depends on the starting pos
+        self.last_shifted_pos = self.rect.y
+        if self.rect.y < 120:
+            self.shift_direction = 1
+        else:
+            self.shift_direction = -1
 
     def spawn(self, current_time):
         Enemy1.spawn(self, current_time)
@@ -548,6 +627,7 @@ class Enemy12(Enemy1):
 
 class Enemy13(Enemy11):
     """ enemy that shifts and shoots at player """
+    batched = False
 
     def __init__(self, game, x, y, has_powerup, images):
         Enemy11.__init__(self, game, x, y, has_powerup, images)
@@ -590,6 +670,16 @@ class Enemy13(Enemy11):
         # shoot at player
         return shot
 
+    def place(self, x, y):
+        Enemy1.place(self, x, y)
+
+        # shift direction depends on the starting pos
+        self.last_shifted_pos = self.rect.y
+        if self.rect.y < 120:
+            self.shift_direction = 1
+        else:
+            self.shift_direction = -1
+
     def spawn(self, current_time):
         Enemy1.spawn(self, current_time)
 
@@ -680,6 +770,8 @@ class Enemy15(Enemy13):
         self.last_shift = current_time
 
 class Boss(Enemy1):
+    batched = False
+
     def __init__(self, game, x, y, has_powerup, images):
         Enemy1.__init__(self, game, x, y, has_powerup, images)
         self.x = x
@@ -738,6 +830,25 @@ class Boss(Enemy1):
                        self.collision_rect5, self.collision_rect6,
                        self.target_rect]
 
+    def clone(self, x, y, has_powerup):
+        boss = Enemy1.clone(self, x, y, has_powerup)
+        boss.direction = list(self.direction)
+        (boss.collision_rect1, boss.collision_rect2, boss.collision_rect3,
+         boss.collision_rect4, boss.collision_rect5, boss.collision_rect6,
+         boss.target_rect) = boss.hitbox
+        return boss
+
+    def place(self, x, y):
+        # move the boss and all hitboxes to x, y
+        self.x = x
+        self.rect.x = x
+        self.rect.y = y
+        self.dx = self.rect.x
+        self.dy = self.rect.y
+        for box, offset in zip(self.hitbox, self.offsets):
+            box.x = self.rect.x + offset[0]
+            box.y = self.rect.y + offset[1]
+
     def spawn(self, current_time):
         # set pos and save spawn time
         self.dx = self.x
@@ -825,11 +936,11 @@ class Boss(Enemy1):
             if self.behavior_2:
                 angle = math.atan2(player_rect.centery - self.rect.centery,
                                    player_rect.centerx - self.rect.centerx)
-                shot = bullets.EnemyBulletAngle(self.rect.left + 16,
+                shot = bullets.EnemyBulletAngle.create(self.rect.left + 16,
                              self.rect.centery - 22, angle, 75, self.bullet_image)
             # shoot straight for behavior 1
             elif self.behavior_1:
-                shot = bullets.EnemyBullet(self.rect.left + 16,
+                shot = bullets.EnemyBullet.create(self.rect.left + 16,
                                     self.rect.centery - 22, 
                                     0, self.bullet_image)
             
@@ -852,8 +963,9 @@ class Boss(Enemy1):
         ex = []
         # create explosion sprite
         for angle in range(0,360,45):
-            ex.append(bullets.Shrapnel(self.rect.centerx, self.rect.centery,
-                                       angle, self.explosion_image))
+            ex.append(bullets.Shrapnel.create(self.rect.centerx,
+                                              self.rect.centery, angle,
+                                              self.explosion_image))
         # play sound
         self.explosion_sound.play()
 
@@ -864,4 +976,65 @@ class Boss(Enemy1):
         return ex, powerup
 
 
-
+# Enemy types by the name used in level files,
+# type name : (enemy class, image key, flip images)
+ENEMY_TYPES = dict()
+
+def register_enemy(enemy_type, enemy_class, image_key = None, flip = False):
+    # register enemy_class under enemy_type. Its images are loaded
+    # with image_key (enemy_type if None) and mirrored if flip is True
+    if image_key is None:
+        image_key = enemy_type
+    ENEMY_TYPES[enemy_type] = (enemy_class, image_key, flip)
+
+register_enemy('enemy_01', Enemy1)
+register_enemy('enemy_02', Enemy2)
+register_enemy('enemy_03', Enemy3)
+register_enemy('enemy_04', Enemy4)
+register_enemy('enemy_05', Enemy5)
+register_enemy('enemy_06', Enemy6)
+register_enemy('enemy_07', Enemy7)
+register_enemy('enemy_08', Enemy8, 'enemy_01', flip = True)
+register_enemy('enemy_09', Enemy9, 'enemy_03', flip = True)
+register_enemy('enemy_10', Enemy10, 'enemy_06', flip = True)
+register_enemy('enemy_11', Enemy11)
+register_enemy('enemy_12', Enemy12)
+register_enemy('enemy_13', Enemy13)
+register_enemy('enemy_14', Enemy14)
+register_enemy('enemy_15', Enemy15)
+register_enemy('boss', Boss)
+
+class EnemyFactory():
+    """ Creates enemies of the registered types by cloning a
+    prototype of each type. Prototypes are built once per factory,
+    so images, flash images and sounds are only looked up once """
+    def __init__(self, game):
+        self.game = game
+        self.prototypes = dict() # type name : prototype enemy
+
+    def get_prototype(self, enemy_type):
+        # return the prototype for enemy_type, building it
+        # the first time it's asked for
+        prototype = self.prototypes.get(enemy_type)
+        if prototype is None:
+            if enemy_type not in ENEMY_TYPES:
+                print 'Unknown enemy type:', enemy_type
+                raise SystemExit
+            enemy_class, image_key, flip = ENEMY_TYPES[enemy_type]
+            images = self.game.image_manager.get_image(image_key)
+            if flip: # left to right enemy
+                images = [pygame.transform.flip(image, True, False)
+                          for image in images]
+                self.game.image_manager.add_masks(images)
+            prototype = enemy_class(self.game, 0, 0, False, images)
+            self.prototypes[enemy_type] = prototype
+        return prototype
+
+    def prepare(self, enemy_types):
+        # build the prototypes for enemy_types ahead of spawning
+        for enemy_type in enemy_types:
+            self.get_prototype(enemy_type)
+
+    def create(self, enemy_type, x, y, has_powerup):
+        # return a new enemy of enemy_type at x, y
+        return self.get_prototype(enemy_type).clone(x, y, has_powerup)
@@ -3,4 +3,10 @@ import system
 import sound
 import gui
 import objects
+import projectiles
+import entities
+import motion
+import collision
+import replay
+import snapshot
 import resource_path
\ No newline at end of file
@@ -0,0 +1,119 @@
+#-------------------------------------------------------------------------------
+# Name:        collision.py
+# Purpose:     Contains the SpatialHash class, a uniform grid used to find
+#              the rects near each other before testing them for overlap,
+#              and functions testing many hitboxes for overlap at once.
+#
+# Author:      Will Taplin
+#
+# Created:     14/12/2011
+# Copyright:   (c) Owner 2011
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+import pygame
+
+# stands in for a missing hitbox, overlaps nothing
+NO_HITBOX = pygame.Rect(0, 0, 0, 0)
+
+def get_hitboxes(sprites):
+    # return the hitbox of each sprite, NO_HITBOX for sprites
+    # with a hitbox of None
+    return [NO_HITBOX if sprite.hitbox is None else sprite.hitbox
+            for sprite in sprites]
+
+def collide_hitboxes(rect, sprites):
+    # return the indices of sprites whose hitbox overlaps rect, in order.
+    # Same test as pygame.Rect.colliderect, made in one call
+    return rect.collidelistall(get_hitboxes(sprites))
+
+def masks_overlap(mask, pos, other_mask, other_pos):
+    # True if mask at pos and other_mask at other_pos share a set
+    # pixel. A missing mask (None) counts as overlapping, leaving
+    # the rect test that came before to decide
+    if mask is None or other_mask is None:
+        return True
+    offset = (other_pos[0] - pos[0], other_pos[1] - pos[1])
+    return mask.overlap(other_mask, offset) is not None
+
+def collide_pairs(sprites, rects):
+    # test every sprite's hitbox against every rect in rects. Returns
+    # (sprite index, rect index) for each overlap, ordered by sprite
+    # then rect, as nested loops over sprites then rects would find them
+    if not sprites:
+        return []
+    hitboxes = get_hitboxes(sprites)
+    if len(rects) == 1:
+        return [(sprite_index, 0) for sprite_index in
+                rects[0].collidelistall(hitboxes)]
+    pairs = []
+    for rect_index, rect in enumerate(rects):
+        for sprite_index in rect.collidelistall(hitboxes):
+            pairs.append((sprite_index, rect_index))
+    pairs.sort()
+    return pairs
+
+class SpatialHash():
+    """ Uniform grid of cell_size cells covering rect. Items are
+    inserted by their rect and listed in every cell it covers, a query
+    returns the items sharing a cell with the rects asked about. Rects
+    outside the grid are clamped to its edge cells so nothing is missed.
+    The grid is cleared and refilled each step """
+    def __init__(self, rect, cell_size = 32):
+        self.rect = pygame.Rect(rect)
+        self.cell_size = cell_size
+        self.columns = (self.rect.width + cell_size - 1) // cell_size
+        self.rows = (self.rect.height + cell_size - 1) // cell_size
+        self.cells = [[] for cell in xrange(self.columns * self.rows)]
+        self.used = [] # cells with items in them, for clear
+        self.count = 0 # items inserted since the last clear
+
+    def __len__(self):
+        return self.count
+
+    def get_range(self, rect):
+        # return the first and last column and row rect covers
+        left = (rect.left - self.rect.left) // self.cell_size
+        right = (rect.right - 1 - self.rect.left) // self.cell_size
+        top = (rect.top - self.rect.top) // self.cell_size
+        bottom = (rect.bottom - 1 - self.rect.top) // self.cell_size
+        last_column = self.columns - 1
+        last_row = self.rows - 1
+        return (min(max(left, 0), last_column),
+                min(max(right, 0), last_column),
+                min(max(top, 0), last_row),
+                min(max(bottom, 0), last_row))
+
+    def clear(self):
+        for cell in self.used:
+            del cell[:]
+        self.used = []
+        self.count = 0
+
+    def insert(self, rect):
+        # add an item covering rect, returns its index.
+        # Items are numbered in the order they are inserted
+        index = self.count
+        self.count += 1
+        cells = self.cells
+        left, right, top, bottom = self.get_range(rect)
+        for row in xrange(top, bottom + 1):
+            start = row * self.columns
+            for cell in cells[start + left:start + right + 1]:
+                if not cell:
+                    self.used.append(cell)
+                cell.append(index)
+        return index
+
+    def query(self, rects):
+        # return the indices, in insertion order, of the items
+        # in the cells covered by any of rects
+        found = set()
+        cells = self.cells
+        for rect in rects:
+            left, right, top, bottom = self.get_range(rect)
+            for row in xrange(top, bottom + 1):
+                start = row * self.columns
+                for cell in cells[start + left:start + right + 1]:
+                    found.update(cell)
+        return sorted(found)
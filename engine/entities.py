@@ -0,0 +1,269 @@
+#-------------------------------------------------------------------------------
+# Name:        entities.py
+# Purpose:     Contains the World class, an entity-component store keeping
+#              each component's fields packed in numpy arrays, and the
+#              systems that update those components in bulk.
+#
+# Author:      Will Taplin
+#
+# Created:     15/12/2011
+# Copyright:   (c) Owner 2011
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+from system import TIMESTEP
+
+# numpy is optional, without it sprites update themselves
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# component name : fields, as (field name, numpy type name).
+# Field names are unique across components
+COMPONENTS = {
+    # position as floats
+    'transform': [('x', 'float64'), ('y', 'float64')],
+    # constant speed along x, weaving along y by sin(angle) * radius
+    'velocity': [('vx', 'float64'), ('radius', 'float64'),
+                 ('dangle', 'float64'), ('angle', 'float64')],
+    # rect position last written and the hitbox's offset from it
+    'hitbox': [('rect_x', 'int32'), ('rect_y', 'int32'),
+               ('hb_offsetx', 'int32'), ('hb_offsety', 'int32')],
+    # frame animation, delay in m/s per frame
+    'animation': [('frame', 'int32'), ('frames', 'int32'),
+                  ('delay', 'int32'), ('last_update', 'int64')],
+    # left and right edges the entity is removed past
+    'bounds': [('left', 'int32'), ('right', 'int32')],
+    # time between shots, shooting only while x is past stop_x
+    'weapon': [('shot_delay', 'int32'), ('last_shot', 'int64'),
+               ('stop_x', 'int32')],
+    # hits left before the entity is destroyed
+    'health': [('hits', 'int32')],
+}
+
+class Archetype():
+    """ Storage for all entities with the same set of components.
+    Each field is a numpy array with a row per entity, rows stay
+    in the order the entities were created. self.sprites holds the
+    sprite, if any, that each entity stands for """
+    def __init__(self, components, capacity = 64):
+        self.components = components
+        self.fields = []
+        for component in components:
+            self.fields.extend(COMPONENTS[component])
+        self.entities = [] # entity of each row
+        self.sprites = [] # sprite of each row
+        self.capacity = 0
+        self.grow(capacity)
+
+    def __len__(self):
+        return len(self.entities)
+
+    def grow(self, capacity):
+        # resize every array to capacity rows, keeping the rows in use
+        n = len(self.entities)
+        for name, dtype in self.fields:
+            column = numpy.zeros(capacity, dtype)
+            if self.capacity:
+                column[:n] = getattr(self, name)[:n]
+            setattr(self, name, column)
+        self.capacity = capacity
+
+    def __getstate__(self):
+        # snapshots keep only the rows in use, as bytes
+        state = dict(self.__dict__)
+        for name, dtype in self.fields:
+            state[name] = self.column(name).tostring()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        n = len(self.entities)
+        for name, dtype in self.fields:
+            column = numpy.zeros(self.capacity, dtype)
+            column[:n] = numpy.fromstring(state[name], dtype)
+            setattr(self, name, column)
+
+    def add(self, entity, sprite, values):
+        # add a row for entity, fields missing from values are 0
+        row = len(self.entities)
+        if row == self.capacity:
+            self.grow(self.capacity * 2)
+        self.entities.append(entity)
+        self.sprites.append(sprite)
+        for name, dtype in self.fields:
+            getattr(self, name)[row] = values.get(name, 0)
+        return row
+
+    def compact(self, keep):
+        # keep only the rows where keep is True, in order
+        n = len(self.entities)
+        count = int(numpy.count_nonzero(keep))
+        for name, dtype in self.fields:
+            column = getattr(self, name)
+            column[:count] = column[:n][keep]
+        keep = keep.tolist()
+        self.entities = [entity for entity, live in
+                         zip(self.entities, keep) if live]
+        self.sprites = [sprite for sprite, live in
+                        zip(self.sprites, keep) if live]
+
+    def column(self, name):
+        # the rows in use of field name
+        return getattr(self, name)[:len(self.entities)]
+
+class World():
+    """ Entities are ids with a set of components, fixed when they
+    are created. Entities with the same components share an Archetype,
+    so a system can update a field of all of them in one numpy
+    operation. Destroyed entities are removed together by collect """
+    def __init__(self):
+        self.archetypes = dict() # component names : Archetype
+        self.locations = dict() # entity : (Archetype, row)
+        self.next_entity = 0
+        self.destroyed = set() # entities waiting for collect
+        self.queries = dict() # components : archetypes having them
+
+    def __len__(self):
+        return len(self.locations)
+
+    def create(self, sprite = None, **components):
+        # create an entity for sprite, each keyword names a component
+        # and gives a dict of its field values. Returns the new entity
+        names = tuple(sorted(components))
+        archetype = self.archetypes.get(names)
+        if archetype is None:
+            archetype = Archetype(names)
+            self.archetypes[names] = archetype
+            self.queries = dict()
+        values = dict()
+        for fields in components.values():
+            values.update(fields)
+        entity = self.next_entity
+        self.next_entity += 1
+        self.locations[entity] = (archetype,
+                                  archetype.add(entity, sprite, values))
+        return entity
+
+    def destroy(self, entity):
+        self.destroyed.add(entity)
+
+    def collect(self):
+        # remove the destroyed entities from their archetypes
+        if not self.destroyed:
+            return
+        for archetype in self.archetypes.values():
+            keep = numpy.array([entity not in self.destroyed for
+                                entity in archetype.entities], numpy.bool_)
+            if not keep.all():
+                archetype.compact(keep)
+                for row, entity in enumerate(archetype.entities):
+                    self.locations[entity] = (archetype, row)
+        for entity in self.destroyed:
+            self.locations.pop(entity, None)
+        self.destroyed = set()
+
+    def get(self, entity, field):
+        archetype, row = self.locations[entity]
+        return getattr(archetype, field)[row]
+
+    def set(self, entity, field, value):
+        archetype, row = self.locations[entity]
+        getattr(archetype, field)[row] = value
+
+    def query(self, *components):
+        # return the archetypes, with rows, that have all of components.
+        # Systems take the world and return their results per archetype
+        # as (archetype, rows, ...) with lists of rows and values
+        archetypes = self.queries.get(components)
+        if archetypes is None:
+            archetypes = [archetype for archetype in self.archetypes.values()
+                          if all(component in archetype.components
+                                 for component in components)]
+            self.queries[components] = archetypes
+        return [archetype for archetype in archetypes if archetype.entities]
+
+def animate(world, current_time):
+    # step the frame of every animation that's due. Returns
+    # (archetype, rows, frames) for the rows that changed frame
+    changed = []
+    for archetype in world.query('animation'):
+        frame = archetype.column('frame')
+        last_update = archetype.column('last_update')
+        due = current_time - last_update > archetype.column('delay')
+        if due.any():
+            frame[due] += 1
+            frame[due & (frame >= archetype.column('frames'))] = 0
+            last_update[due] = current_time
+            changed.append((archetype, numpy.nonzero(due)[0].tolist(),
+                            frame[due].tolist()))
+    return changed
+
+def move(world):
+    # move along x and weave along y one timestep
+    for archetype in world.query('transform', 'velocity'):
+        angle = archetype.column('angle')
+        archetype.column('y')[:] += numpy.sin(angle) * \
+                                    archetype.column('radius')
+        archetype.column('x')[:] += archetype.column('vx') * TIMESTEP
+        angle += archetype.column('dangle') * TIMESTEP
+
+def place_hitboxes(world):
+    # update the rect positions from the transforms, truncating like
+    # pygame.Rect does. Returns (archetype, rows, rect xs, rect ys,
+    # hitbox xs, hitbox ys) for the rows whose rect moved a whole pixel
+    moved_rects = []
+    for archetype in world.query('transform', 'hitbox'):
+        rect_x = archetype.column('x').astype(numpy.int32)
+        rect_y = archetype.column('y').astype(numpy.int32)
+        moved = (rect_x != archetype.column('rect_x')) | \
+                (rect_y != archetype.column('rect_y'))
+        archetype.column('rect_x')[:] = rect_x
+        archetype.column('rect_y')[:] = rect_y
+        if moved.any():
+            rect_x = rect_x[moved]
+            rect_y = rect_y[moved]
+            moved_rects.append((archetype, numpy.nonzero(moved)[0].tolist(),
+                                rect_x.tolist(), rect_y.tolist(),
+                                (rect_x +
+                                 archetype.column('hb_offsetx')[moved]).tolist(),
+                                (rect_y +
+                                 archetype.column('hb_offsety')[moved]).tolist()))
+    return moved_rects
+
+def leave_bounds(world):
+    # return (archetype, rows) for the rows that moved past
+    # the bound they're heading for
+    gone = []
+    for archetype in world.query('transform', 'velocity', 'bounds'):
+        x = archetype.column('x')
+        vx = archetype.column('vx')
+        past = ((vx < 0) & (x < archetype.column('left'))) | \
+               ((vx > 0) & (x > archetype.column('right')))
+        if past.any():
+            gone.append((archetype, numpy.nonzero(past)[0].tolist()))
+    return gone
+
+def fire_weapons(world, current_time):
+    # return (archetype, rows) for the rows whose weapon is ready,
+    # and restart their timers
+    ready = []
+    for archetype in world.query('transform', 'weapon'):
+        last_shot = archetype.column('last_shot')
+        due = (archetype.column('x') > archetype.column('stop_x')) & \
+              (current_time - last_shot > archetype.column('shot_delay'))
+        if due.any():
+            last_shot[due] = current_time
+            ready.append((archetype, numpy.nonzero(due)[0].tolist()))
+    return ready
+
+def find_destroyed(world):
+    # return (archetype, rows) for the rows that have taken more
+    # hits than they had left
+    destroyed = []
+    for archetype in world.query('health'):
+        hits = archetype.column('hits')
+        if (hits < 0).any():
+            destroyed.append((archetype, numpy.nonzero(hits < 0)[0].tolist()))
+    return destroyed
@@ -26,10 +26,13 @@ class ImageManager():
         w, h - width and height of individual frame (sprite sheet)
         rows - boolean for whether the sprite sheet has multiple rows or not
         colorkey - RGB value for transparency, - 1 will take color from top
-                   left corner of image for transparency """
+                   left corner of image for transparency
+        A collision mask is made for every image and frame as it is
+        loaded, get_mask looks them up by image """
 
     def __init__(self):
         self.images = dict()  # dictionary of all images loaded
+        self.masks = dict()  # image : mask of its opaque pixels
 
     def load_image(self, filename, colorkey = None):
         # call pygame image load function
@@ -70,12 +73,28 @@ class ImageManager():
         # loads a single image into the image manager
         image = self.load_image(filename, colorkey)
         self.images[key] = image
+        self.add_masks([image])
 
     def load_sheet(self, filename, key, w, h, rows = True, colorkey = None):
         # loads an image sheet into the image manager
         # load_sliced_images returns the individual frames or tiles
         images = self.load_sliced_images(filename, w, h, rows, colorkey)
         self.images[key] = images
+        self.add_masks(images)
+
+    def add_masks(self, images):
+        # make and cache the masks of a list of images, or list of
+        # rows of images. Use for images made after loading, such as
+        # flipped frames, so their masks aren't made during play
+        for image in images:
+            if isinstance(image, list):
+                self.add_masks(image)
+            elif image not in self.masks:
+                self.masks[image] = pygame.mask.from_surface(image)
+
+    def get_mask(self, image):
+        # return the cached mask of image, None if it has none
+        return self.masks.get(image)
 
     def load_font(self, filename, size):
         fullname = os.path.join('res', 'fonts', filename)
@@ -96,7 +115,15 @@ class ImageManager():
 
     def unload_image(self, key):
         # unload an image from the image manager
-        del self.images[key]
+        images = self.images.pop(key)
+        if not isinstance(images, list):
+            images = [images]
+        for image in images:
+            if isinstance(image, list):
+                for frame in image:
+                    self.masks.pop(frame, None)
+            else:
+                self.masks.pop(image, None)
 
 class Viewport():
     """ This class creates a viewport that is the size
@@ -175,7 +202,7 @@ class FadeAnimation():
         self.fade.set_alpha(self.alpha)
         self.delay = 800 # delay before fading starts
         self.speed = 295 # fade speed
-        self.started = pygame.time.get_ticks()
+        self.started = system.get_ticks()
 
     def update(self, current_time):
         active = True
@@ -198,4 +225,14 @@ class FadeAnimation():
         return active
 
     def draw(self, screen):
-        screen.blit(self.fade, (0,0))
\ No newline at end of file
+        screen.blit(self.fade, (0,0))
+
+
+def blit_all(surface, blit_sequence):
+    # blit each (image, position) in blit_sequence to surface, in one
+    # call on pygame 1.9.4 and later, which have Surface.blits
+    if hasattr(surface, 'blits'):
+        surface.blits(blit_sequence, doreturn = 0)
+    else:
+        for image, position in blit_sequence:
+            surface.blit(image, position)
@@ -14,6 +14,77 @@ import pygame
 from pygame.locals import *
 import system
 
+class BitmapFont():
+    """ Glyph cache text renderer for fixed width fonts.  Each character
+    is rendered once per color and strings are built by blitting the
+    cached glyphs.  Whole strings can optionally be memoized as well.
+    Has render, size and get_height methods so it can be used in place
+    of a pygame font
+    font - a loaded pygame font
+    memo_size - max number of whole strings to keep, 0 to disable """
+    def __init__(self, font, memo_size = 128):
+        self.font = font
+        self.glyphs = dict()  # (char, color) : glyph surface
+        self.memo = dict()  # (text, color) : string surface
+        self.memo_size = memo_size
+        self.char_width = font.size(' ')[0]  # every glyph is this wide
+        self.height = font.get_height()
+        self.colorkey = (255,0,255)
+
+    def get_glyph(self, char, color):
+        # returns the cached render of a single character,
+        # rendering it the first time it is asked for
+        key = (char, tuple(color))
+        glyph = self.glyphs.get(key)
+        if glyph is None:
+            glyph = self.font.render(char, False, color)
+            self.glyphs[key] = glyph
+        return glyph
+
+    def render(self, text, antialias, color):
+        # returns a surface with text drawn on it, like pygame's
+        # font.render.  antialias is ignored, glyphs are always
+        # rendered without it
+        key = (text, tuple(color))
+        surface = self.memo.get(key)
+        if surface is not None:
+            return surface
+
+        # pick a transparent color that isn't the text color
+        colorkey = self.colorkey
+        if tuple(color) == colorkey:
+            colorkey = (0,0,0)
+        surface = pygame.Surface((len(text) * self.char_width, self.height))
+        surface.fill(colorkey)
+        surface.set_colorkey(colorkey, RLEACCEL)
+        self.draw(surface, text, (0,0), color)
+
+        if self.memo_size > 0:
+            # start over rather than track usage, strings that are
+            # still in use get cached again on the next call
+            if len(self.memo) >= self.memo_size:
+                self.memo.clear()
+            self.memo[key] = surface
+        return surface
+
+    def draw(self, surface, text, pos, color):
+        # blit text straight onto surface at pos, one cached glyph
+        # at a time. returns the width drawn
+        x, y = pos
+        for char in text:
+            surface.blit(self.get_glyph(char, color), (x, y))
+            x += self.char_width
+        return x - pos[0]
+
+    def size(self, text):
+        return (len(text) * self.char_width, self.height)
+
+    def get_height(self):
+        return self.height
+
+    def get_linesize(self):
+        return self.font.get_linesize()
+
 class TextBox():
     """ Abstract base class for displaying a bordered text box in game.
         Menus, dialog boxes, etc. """
@@ -239,8 +310,8 @@ class DialogBox(TextBox):
                     self.text_x = 8  # start at the left again
                     self.text_y += 8 # drop down to the next line
                 if letter != '\n': # consume newline char
-                    self.render = self.font.render(letter, False, self.text_color)
-                    self.background.blit(self.render, (self.text_x, self.text_y))
+                    self.font.draw(self.background, letter,
+                                   (self.text_x, self.text_y), self.text_color)
                     self.text_x += 8  # next char position
                     self.sound.play()  # blip, blip, blip...
                 self.char += 1  # next letter
@@ -270,7 +341,7 @@ class Message():
     def __init__(self, game, message, lifetime):
         self.message = message
         self.lifetime = lifetime
-        self.created = pygame.time.get_ticks()
+        self.created = system.get_ticks()
         self.render = game.font.render(self.message, False, game.text_color)
         self.x = (system.SCREEN_RECT.width - self.render.get_width()) / 2
         self.y = (system.SCREEN_RECT.height - self.render.get_height()) / 2
@@ -279,7 +350,7 @@ class Message():
         # shows the message for the duration of self.lifetime
         # returns true when message is done
         showing = True
-        current_time = pygame.time.get_ticks()
+        current_time = system.get_ticks()
         if current_time - self.created < self.lifetime:
             screen.blit(self.render, (self.x, self.y))
         else: # lifetime has passed
@@ -321,7 +392,10 @@ class MenuManager():
             return False
 
 class HudElement():
-    """ Bass class for HUD elements such as score, power bars, etc """
+    """ Bass class for HUD elements such as score, power bars, etc
+    Elements only redraw their background when the values they display
+    change.  Override get_values to return those values and redraw to
+    draw them """
 
     def __init__(self, game, size, pos, color):
         self.pos = pos
@@ -330,9 +404,26 @@ class HudElement():
         self.background.fill(self.color)
         self.font = game.font
         self.text_color = game.text_color
+        self.values = None  # values shown by the last redraw
+        self.dirty = True  # background changed since the HUD last drew it
 
-    def update(self):
-        self.background.fill(self.color)
+    def get_values(self, *args):
+        # returns the values this element displays,
+        # None redraws every update
+        return None
+
+    def update(self, *args):
+        # redraw the background only if the displayed values changed
+        values = self.get_values(*args)
+        if values is None or values != self.values:
+            self.values = values
+            self.background.fill(self.color)
+            self.redraw(*args)
+            self.dirty = True
+
+    def redraw(self, *args):
+        # draw the element to its background
+        pass
 
     def draw(self):
         pass
@@ -356,7 +447,10 @@ class Hud(TextBox):
 
     def draw(self, screen):
         
+        # only re-composite elements that have been redrawn
         for element in self.elements:
-            self.background.blit(element.background, element.pos)
+            if element.dirty:
+                self.background.blit(element.background, element.pos)
+                element.dirty = False
 
         screen.blit(self.background, (0,0))
\ No newline at end of file
@@ -0,0 +1,150 @@
+#-------------------------------------------------------------------------------
+# Name:        motion.py
+# Purpose:     Contains the MotionBatch class, moves, animates and fires
+#              the weapons of sprites with simple scripted paths together
+#              as entities of an entities.World.
+#
+# Author:      Will Taplin
+#
+# Created:     05/12/2011
+# Copyright:   (c) Owner 2011
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+import entities
+
+# numpy is optional, without it sprites update themselves
+numpy = entities.numpy
+
+class MotionBatch():
+    """ Adapter between sprites and an entities.World. Each sprite
+    added becomes an entity with transform, velocity, hitbox, animation
+    and bounds components, plus a weapon for sprites that shoot, and
+    update runs the world's systems then copies the results back to
+    the sprites: frame images, rect and hitbox for sprites whose pixel
+    position changed, and the shots of weapons that fired. Sprites
+    leaving their bounds are killed.
+
+    Sprites provide dx, dy, rect, hitbox (a one rect list),
+    hb_offsetx, hb_offsety, bounds, images, frame, delay, last_update,
+    get_motion(), returning (x speed, radius, dAngle, angle), and
+    get_weapon(), returning (shot delay, last shot, stop x) or None.
+    Sprites with a weapon provide fire(player_rect), returning a shot """
+    def __init__(self):
+        self.world = entities.World()
+        self.members = set() # sprites in the batch
+
+    def __len__(self):
+        return len(self.members)
+
+    def add(self, sprite):
+        # take over moving sprite
+        vx, radius, dangle, angle = sprite.get_motion()
+        components = dict(
+            transform = {'x': sprite.dx, 'y': sprite.dy},
+            velocity = {'vx': vx, 'radius': radius,
+                        'dangle': dangle, 'angle': angle},
+            hitbox = {'rect_x': sprite.rect.x, 'rect_y': sprite.rect.y,
+                      'hb_offsetx': sprite.hb_offsetx,
+                      'hb_offsety': sprite.hb_offsety},
+            animation = {'frame': sprite.frame,
+                         'frames': len(sprite.images),
+                         'delay': sprite.delay,
+                         'last_update': sprite.last_update},
+            bounds = {'left': sprite.bounds.left,
+                      'right': sprite.bounds.right})
+        weapon = sprite.get_weapon()
+        if weapon is not None:
+            shot_delay, last_shot, stop_x = weapon
+            components['weapon'] = {'shot_delay': shot_delay,
+                                    'last_shot': last_shot,
+                                    'stop_x': stop_x}
+        self.world.create(sprite, **components)
+        self.members.add(sprite)
+
+    def sync(self, archetype, row):
+        # copy a row's movement, animation and weapon state back
+        # to its sprite
+        sprite = archetype.sprites[row]
+        sprite.dx = float(archetype.x[row])
+        sprite.dy = float(archetype.y[row])
+        if hasattr(sprite, 'angle'):
+            sprite.angle = float(archetype.angle[row])
+        sprite.frame = int(archetype.frame[row])
+        sprite.last_update = int(archetype.last_update[row])
+        if 'weapon' in archetype.components:
+            sprite.last_shot = int(archetype.last_shot[row])
+
+    def get_positions(self):
+        # return a dict of sprite : (x, y) for the sprites in the batch
+        positions = dict()
+        for archetype in self.world.query('transform'):
+            positions.update(zip(archetype.sprites,
+                                 zip(archetype.column('x').tolist(),
+                                     archetype.column('y').tolist())))
+        return positions
+
+    def remove_dead(self):
+        # destroy the entities of sprites that were killed
+        world = self.world
+        for archetype in world.query():
+            for entity, sprite in zip(archetype.entities, archetype.sprites):
+                if not sprite.alive():
+                    world.destroy(entity)
+                    self.members.discard(sprite)
+        world.collect()
+
+    def release(self):
+        # hand the living sprites back to their own update methods,
+        # with their state copied back, and empty the batch. Returns
+        # the sprites in the order they were added
+        self.remove_dead()
+        sprites = []
+        for archetype in self.world.query():
+            for row, entity in enumerate(archetype.entities):
+                self.sync(archetype, row)
+                sprites.append((entity, archetype.sprites[row]))
+                self.world.destroy(entity)
+        self.world.collect()
+        self.members = set()
+        sprites.sort()
+        return [sprite for entity, sprite in sprites]
+
+    def update(self, current_time, player_rect):
+        # move, animate and fire the weapons of every sprite in the
+        # batch. Returns the list of shots fired
+        self.remove_dead()
+        if not self.members:
+            return []
+        world = self.world
+
+        for archetype, rows, frames in entities.animate(world, current_time):
+            sprites = archetype.sprites
+            for row, frame in zip(rows, frames):
+                sprite = sprites[row]
+                sprite.image = sprite.images[frame]
+
+        entities.move(world)
+
+        for archetype, rows, xs, ys, hb_xs, hb_ys in \
+            entities.place_hitboxes(world):
+            sprites = archetype.sprites
+            for row, x, y, hb_x, hb_y in zip(rows, xs, ys, hb_xs, hb_ys):
+                sprite = sprites[row]
+                sprite.rect.x = x
+                sprite.rect.y = y
+                hitbox = sprite.hitbox[0]
+                hitbox.x = hb_x
+                hitbox.y = hb_y
+
+        for archetype, rows in entities.leave_bounds(world):
+            for row in rows:
+                self.sync(archetype, row)
+                archetype.sprites[row].kill()
+
+        shots = []
+        for archetype, rows in entities.fire_weapons(world, current_time):
+            sprites = archetype.sprites
+            for row in rows:
+                shots.append(sprites[row].fire(player_rect))
+        return shots
@@ -19,6 +19,9 @@ class AnimatedSprite(pygame.sprite.Sprite):
     """ Enhanced version of pygame's sprite class
     sets up some common values for movement and frame animation.
     Update method will animate the sprites images at fps """
+    # a sprite manager can skip update until the time passes wake_time,
+    # for sprites with nothing to do until then
+    wake_time = -1
     def __init__(self,x, y, images, fps = 10, rows = False):
         pygame.sprite.Sprite.__init__(self)
         # load images and sounds
@@ -54,6 +57,65 @@ class AnimatedSprite(pygame.sprite.Sprite):
     def handle_input(self, current_time):
         pass
 
+class SpritePool():
+    """ Keeps killed sprites of one class for reuse. acquire returns
+    a free sprite reset in place with the given arguments, or a new
+    sprite if none are free """
+    def __init__(self, sprite_class):
+        self.sprite_class = sprite_class
+        self.free = []
+        self.created = 0 # sprites allocated by the pool
+        self.reused = 0 # sprites handed out again from self.free
+
+    def acquire(self, *args):
+        # return a sprite initialized with args
+        if self.free:
+            sprite = self.free.pop()
+            sprite.reset(*args)
+            self.reused += 1
+        else:
+            sprite = self.sprite_class(*args)
+            self.created += 1
+        return sprite
+
+    def release(self, sprite):
+        # take back a sprite that is no longer in use
+        self.free.append(sprite)
+
+    def prewarm(self, count, *args):
+        # allocate sprites until count are free
+        while len(self.free) < count:
+            self.free.append(self.sprite_class(*args))
+            self.created += 1
+
+    def reset_stats(self):
+        self.created = 0
+        self.reused = 0
+
+class PooledSprite():
+    """ Mixin for sprites that are recycled through a SpritePool,
+    list it before pygame.sprite.Sprite in the bases. Subclasses
+    define reset, taking the same arguments as __init__, and are
+    created with create instead of the constructor. Killing the
+    sprite returns it to its class's pool """
+    @classmethod
+    def get_pool(cls):
+        # each class gets its own pool on first use
+        if 'pool' not in cls.__dict__:
+            cls.pool = SpritePool(cls)
+        return cls.pool
+
+    @classmethod
+    def create(cls, *args):
+        return cls.get_pool().acquire(*args)
+
+    def kill(self):
+        # sprites can be killed more than once a frame,
+        # only return them to the pool the first time
+        if self.alive():
+            pygame.sprite.Sprite.kill(self)
+            self.get_pool().release(self)
+
 class SpriteManager():
     """ Abstract class for sprite manager.
     self.sprite is intended to hold pygame sprite groups """
@@ -92,6 +154,9 @@ class EventState(system.State):
         self.lines = []
         self.music = music
         self.to_state = to_state
+        # start loading the music now, it plays on activate
+        if self.music is not None:
+            game.sound_manager.prefetch_music(self.music)
         
     
     def activate(self, transition):
@@ -99,7 +164,7 @@ class EventState(system.State):
 
         # pause interpolated draw, stop music create render from text, 
         # centered
-        self.last_update = pygame.time.get_ticks()
+        self.last_update = system.get_ticks()
         self.game.paused = True
         if self.music is not None:
             self.game.sound_manager.play_music(self.music, 1)
@@ -113,7 +178,7 @@ class EventState(system.State):
     def update(self):
         system.State.update(self)
 
-        current_time = pygame.time.get_ticks()
+        current_time = system.get_ticks()
 
         # after duration start transitioning off
         if current_time - self.last_update > self.duration:
@@ -0,0 +1,278 @@
+#-------------------------------------------------------------------------------
+# Name:        projectiles.py
+# Purpose:     Contains the BulletEngine class, moves, culls, collides and
+#              draws bullets stored in numpy arrays rather than as sprites.
+#
+# Author:      Will Taplin
+#
+# Created:     11/12/2011
+# Copyright:   (c) Owner 2011
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+import pygame
+import graphics
+from system import TIMESTEP
+from system import SCREEN_RECT
+
+# numpy is optional, without it bullets stay ordinary sprites
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# ways a bullet can leave its bounds
+CULL_RIGHT = 0 # right edge has passed bounds.right
+CULL_LEFT = 1 # left edge has reached bounds.left
+CULL_OUTSIDE = 2 # no longer entirely inside bounds
+
+class BulletEngine():
+    """ Keeps bullets as rows of numpy arrays instead of sprites.
+    A row holds the bullet's position, velocity, rect, hitbox, owner
+    (the sprite group the bullet would be in), cull mode and image.
+    update moves and culls every bullet at once, collisions are tested
+    in batches and each owner's bullets are drawn in one batch """
+    def __init__(self, owners, capacity = 256):
+        self.owners = dict() # owner key : owner id
+        for key in owners:
+            self.owners[key] = len(self.owners)
+        self.images = [] # images, indexed by image id
+        self.image_ids = dict() # image : image id
+        self.fields = [('x', numpy.float64), ('y', numpy.float64),
+                       ('vx', numpy.float64), ('vy', numpy.float64),
+                       ('rect_x', numpy.int32), ('rect_y', numpy.int32),
+                       ('width', numpy.int32), ('height', numpy.int32),
+                       ('hb_x', numpy.int32), ('hb_y', numpy.int32),
+                       ('hb_width', numpy.int32), ('hb_height', numpy.int32),
+                       ('hb_offsetx', numpy.int32),
+                       ('hb_offsety', numpy.int32),
+                       ('owner', numpy.int8), ('cull', numpy.int8),
+                       ('follow_bounds', numpy.bool_),
+                       ('image', numpy.int16), ('alive', numpy.bool_)]
+        self.count = 0 # rows in use, including dead rows
+        self.capacity = 0
+        self.grow(capacity)
+
+    def grow(self, capacity):
+        # resize every array to capacity rows, keeping the rows in use
+        for name, dtype in self.fields:
+            column = numpy.zeros(capacity, dtype)
+            if self.capacity:
+                column[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, column)
+        self.capacity = capacity
+
+    def __getstate__(self):
+        # snapshots keep only the rows in use, as bytes
+        state = dict(self.__dict__)
+        for name, dtype in self.fields:
+            state[name] = getattr(self, name)[:self.count].tostring()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for name, dtype in self.fields:
+            column = numpy.zeros(self.capacity, dtype)
+            column[:self.count] = numpy.fromstring(state[name], dtype)
+            setattr(self, name, column)
+
+    def get_image_id(self, image):
+        image_id = self.image_ids.get(image)
+        if image_id is None:
+            image_id = len(self.images)
+            self.images.append(image)
+            self.image_ids[image] = image_id
+        return image_id
+
+    def add_sprite(self, owner, sprite):
+        # add a row copied from a bullet sprite and return its index.
+        # The sprite needs dx, dy, rect, hitbox, image, cull and
+        # follow_bounds, and get_velocity and get_hitbox_offset methods
+        if self.count == self.capacity:
+            self.grow(self.capacity * 2)
+        i = self.count
+        self.count += 1
+        self.x[i] = sprite.dx
+        self.y[i] = sprite.dy
+        self.vx[i], self.vy[i] = sprite.get_velocity()
+        self.rect_x[i] = sprite.rect.x
+        self.rect_y[i] = sprite.rect.y
+        self.width[i] = sprite.rect.width
+        self.height[i] = sprite.rect.height
+        self.hb_x[i] = sprite.hitbox.x
+        self.hb_y[i] = sprite.hitbox.y
+        self.hb_width[i] = sprite.hitbox.width
+        self.hb_height[i] = sprite.hitbox.height
+        self.hb_offsetx[i], self.hb_offsety[i] = sprite.get_hitbox_offset()
+        self.owner[i] = self.owners[owner]
+        self.cull[i] = sprite.cull
+        self.follow_bounds[i] = sprite.follow_bounds
+        self.image[i] = self.get_image_id(sprite.image)
+        self.alive[i] = True
+        return i
+
+    def compact(self):
+        # drop dead rows, the rest keep their order
+        n = self.count
+        keep = self.alive[:n]
+        alive = int(numpy.count_nonzero(keep))
+        if alive < n:
+            for name, dtype in self.fields:
+                column = getattr(self, name)
+                column[:alive] = column[:n][keep]
+            self.count = alive
+
+    def update(self, bounds):
+        # move all bullets one step and kill the ones that left
+        # their bounds. Rows that follow bounds are checked against
+        # bounds, the others against SCREEN_RECT
+        if not self.count:
+            return
+        self.compact()
+        n = self.count
+        if n == 0:
+            return
+        x = self.x[:n]
+        y = self.y[:n]
+        rect_x = self.rect_x[:n]
+        rect_y = self.rect_y[:n]
+        x += self.vx[:n] * TIMESTEP
+        y += self.vy[:n] * TIMESTEP
+        # rects truncate like pygame.Rect does
+        rect_x[:] = x
+        rect_y[:] = y
+        self.hb_x[:n] = rect_x + self.hb_offsetx[:n]
+        self.hb_y[:n] = rect_y + self.hb_offsety[:n]
+
+        follow = self.follow_bounds[:n]
+        left = numpy.where(follow, bounds.left, SCREEN_RECT.left)
+        top = numpy.where(follow, bounds.top, SCREEN_RECT.top)
+        right = numpy.where(follow, bounds.right, SCREEN_RECT.right)
+        bottom = numpy.where(follow, bounds.bottom, SCREEN_RECT.bottom)
+        rect_right = rect_x + self.width[:n]
+        inside = (rect_x >= left) & (rect_y >= top) & \
+                 (rect_right <= right) & \
+                 (rect_y + self.height[:n] <= bottom)
+        cull = self.cull[:n]
+        dead = ((cull == CULL_RIGHT) & (rect_right > right)) | \
+               ((cull == CULL_LEFT) & (rect_x <= left)) | \
+               ((cull == CULL_OUTSIDE) & ~inside)
+        self.alive[:n] &= ~dead
+
+    def get_rows(self, owner):
+        # indices of owner's living bullets, in the order they were added
+        if not self.count or owner not in self.owners:
+            return numpy.zeros(0, numpy.intp)
+        n = self.count
+        return numpy.nonzero(self.alive[:n] &
+                             (self.owner[:n] == self.owners[owner]))[0]
+
+    def overlap(self, rows, rect):
+        # True for each row whose hitbox overlaps rect, same test
+        # as pygame.Rect.colliderect
+        if rect.width <= 0 or rect.height <= 0:
+            return numpy.zeros(len(rows), numpy.bool_)
+        hb_x = self.hb_x[rows]
+        hb_y = self.hb_y[rows]
+        hb_width = self.hb_width[rows]
+        hb_height = self.hb_height[rows]
+        return (hb_width > 0) & (hb_height > 0) & \
+               (hb_x < rect.right) & (hb_x + hb_width > rect.left) & \
+               (hb_y < rect.bottom) & (hb_y + hb_height > rect.top)
+
+    def collide_rect(self, owner, rect):
+        # return the indices of owner's bullets that hit rect
+        if not self.count:
+            return []
+        rows = self.get_rows(owner)
+        return rows[self.overlap(rows, rect)].tolist()
+
+    def collide_boxes(self, owner, boxes):
+        # test owner's bullets against every rect in boxes in one batch.
+        # Returns the rows tested and a rows x boxes array of hits, or
+        # None if nothing hit. Read it with get_box_hits
+        rows = self.get_rows(owner)
+        if not len(rows) or not boxes:
+            return rows, None
+        box = numpy.array([tuple(rect) for rect in boxes], numpy.int32)
+        left = box[:, 0]
+        top = box[:, 1]
+        right = left + box[:, 2]
+        bottom = top + box[:, 3]
+        # one row per bullet, one column per box
+        hb_x = self.hb_x[rows][:, None]
+        hb_y = self.hb_y[rows][:, None]
+        hb_width = self.hb_width[rows][:, None]
+        hb_height = self.hb_height[rows][:, None]
+        hits = (hb_width > 0) & (hb_height > 0) & \
+               (box[:, 2] > 0) & (box[:, 3] > 0) & \
+               (hb_x < right) & (hb_x + hb_width > left) & \
+               (hb_y < bottom) & (hb_y + hb_height > top)
+        if not hits.any():
+            hits = None
+        return rows, hits
+
+    def get_box_hits(self, collision, start, stop):
+        # return (index, box number) for each hit on boxes start to
+        # stop of a collide_boxes result, bullet by bullet and box
+        # numbers counted from start. Bullets killed since the batch
+        # was tested are left out
+        rows, hits = collision
+        pairs = []
+        if hits is None:
+            return pairs
+        for row, column in zip(*numpy.nonzero(hits[:, start:stop])):
+            index = rows[row]
+            if self.alive[index]:
+                pairs.append((index, column))
+        return pairs
+
+    def get_image(self, index):
+        return self.images[self.image[index]]
+
+    def get_pos(self, index):
+        # top left of the bullet's rect
+        return int(self.rect_x[index]), int(self.rect_y[index])
+
+    def kill(self, index):
+        self.alive[index] = False
+
+    def clear(self, owner):
+        # kill all of owner's bullets
+        if owner not in self.owners:
+            return
+        n = self.count
+        self.alive[:n] &= self.owner[:n] != self.owners[owner]
+
+    def get_count(self, owner):
+        # number of owner's living bullets
+        if not self.count:
+            return 0
+        return len(self.get_rows(owner))
+
+    def draw(self, surface, owner, area = None):
+        # blit all of owner's bullets to surface at once. If area is
+        # given, bullets entirely outside it are skipped. Returns the
+        # number drawn and the number skipped
+        if not self.count:
+            return 0, 0
+        rows = self.get_rows(owner)
+        culled = 0
+        if area is not None and len(rows):
+            rect_x = self.rect_x[rows]
+            rect_y = self.rect_y[rows]
+            inside = (rect_x < area.right) & \
+                     (rect_x + self.width[rows] > area.left) & \
+                     (rect_y < area.bottom) & \
+                     (rect_y + self.height[rows] > area.top)
+            culled = len(rows) - int(numpy.count_nonzero(inside))
+            if culled:
+                rows = rows[inside]
+        if len(rows):
+            images = self.images
+            graphics.blit_all(surface, [(images[image], (x, y))
+                                        for image, x, y in
+                                        zip(self.image[rows].tolist(),
+                                            self.rect_x[rows].tolist(),
+                                            self.rect_y[rows].tolist())])
+        return len(rows), culled
@@ -0,0 +1,149 @@
+#-------------------------------------------------------------------------------
+# Name:        replay.py
+# Purpose:     Contains the InputRecorder class, which records the bound
+#              buttons and game time of every step, and the Replay class,
+#              which plays a recording back in place of the input devices.
+#
+# Author:      Will Taplin
+#
+# Created:     18/12/2011
+# Copyright:   (c) Owner 2011
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+import sys
+import zlib
+import struct
+from array import array
+
+REPLAY_MAGIC = 'PSMR'
+REPLAY_VERSION = 1
+# magic, version, random seed, starting level, game time of the first
+# step, step count, bytes of settings
+REPLAY_HEADER = struct.Struct('<4sHxxIHxxiII')
+
+# the columns of a recording, after the settings, all compressed
+# together. Held buttons are stored as the bits that changed since the
+# step before, and times as the m/s since the step before, so the
+# columns are mostly runs of the same value
+COLUMNS = (('held', 'H'), ('pressed', 'H'), ('ticks', 'i'))
+
+def to_little_endian(column):
+    # return the bytes of array column, little endian
+    if sys.byteorder == 'big':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tostring()
+
+class InputRecorder():
+    """ Records the buttons held and pressed and the game time of each
+    step, with the random seed and level the recording starts at and
+    a dict of settings (name : int) the game needs to play it back the
+    same. save writes it as a compressed file for Replay """
+    def __init__(self, seed, level, settings = None):
+        self.seed = seed
+        self.level = level
+        self.settings = dict(settings or {})
+        self.start_ticks = None # game time of the first step
+        self.last_held = 0
+        self.last_ticks = 0
+        self.held = array('H')
+        self.pressed = array('H')
+        self.ticks = array('i')
+
+    def __len__(self):
+        return len(self.held)
+
+    def record_step(self, input_manager, ticks):
+        # record the buttons of input_manager and the game time
+        # ticks for a step
+        held, pressed = input_manager.get_state()
+        if self.start_ticks is None:
+            self.start_ticks = ticks
+            self.last_ticks = ticks
+        self.held.append(held ^ self.last_held)
+        self.pressed.append(pressed)
+        self.ticks.append(ticks - self.last_ticks)
+        self.last_held = held
+        self.last_ticks = ticks
+
+    def save(self, filename):
+        settings = ''.join(['%s=%d\n' % (name, value) for name, value
+                            in sorted(self.settings.items())])
+        body = settings + ''.join([to_little_endian(getattr(self, name))
+                                   for name, typecode in COLUMNS])
+        header = REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.seed,
+                                    self.level, self.start_ticks or 0,
+                                    len(self), len(settings))
+        recording = open(filename, 'wb')
+        try:
+            recording.write(header + zlib.compress(body, 9))
+        finally:
+            recording.close()
+
+class Replay():
+    """ A recording made by InputRecorder. Set Game.replay to one and
+    each step gets its buttons and game time from play_step instead of
+    the devices and pygame's clock. Raises IOError if filename can't
+    be read or isn't a recording """
+    def __init__(self, filename):
+        recording = open(filename, 'rb')
+        try:
+            data = recording.read()
+        finally:
+            recording.close()
+        if len(data) < REPLAY_HEADER.size:
+            raise IOError('not a recording: %s' % filename)
+        magic, version, self.seed, self.level, start_ticks, count, \
+            settings_bytes = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise IOError('not a recording: %s' % filename)
+        try:
+            body = zlib.decompress(data[REPLAY_HEADER.size:])
+        except zlib.error, message:
+            raise IOError('damaged recording: %s (%s)' % (filename, message))
+
+        self.settings = dict()
+        for line in body[:settings_bytes].splitlines():
+            name, value = line.split('=')
+            self.settings[name] = int(value)
+        start = settings_bytes
+        columns = dict()
+        for name, typecode in COLUMNS:
+            column = array(typecode)
+            end = start + count * column.itemsize
+            column.fromstring(body[start:end])
+            if sys.byteorder == 'big':
+                column.byteswap()
+            columns[name] = column
+            start = end
+        if len(columns['ticks']) != count:
+            raise IOError('damaged recording: %s' % filename)
+
+        # undo the deltas
+        self.held = []
+        held = 0
+        for changed in columns['held']:
+            held ^= changed
+            self.held.append(held)
+        self.pressed = columns['pressed'].tolist()
+        self.ticks = []
+        ticks = start_ticks
+        for elapsed in columns['ticks']:
+            ticks += elapsed
+            self.ticks.append(ticks)
+        self.step = 0 # next step to play
+
+    def __len__(self):
+        return len(self.held)
+
+    def finished(self):
+        return self.step >= len(self.held)
+
+    def play_step(self, input_manager, clock):
+        # give input_manager the buttons and clock the
+        # game time of the next step
+        step = self.step
+        input_manager.set_state(self.held[step], self.pressed[step])
+        clock.ticks = self.ticks[step]
+        self.step += 1
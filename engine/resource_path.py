@@ -1,4 +1,5 @@
 import os
+import sys
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
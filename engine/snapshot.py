@@ -0,0 +1,218 @@
+#-------------------------------------------------------------------------------
+# Name:        snapshot.py
+# Purpose:     Contains the SnapshotManager class, which captures the
+#              simulation of a state into a compact buffer and restores it,
+#              and the RewindBuffer class, a ring of the latest snapshots.
+#
+# Author:      Will Taplin
+#
+# Created:     20/12/2011
+# Copyright:   (c) Owner 2011
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+import types
+import random
+import cPickle
+import copy_reg
+import cStringIO
+from array import array
+import pygame
+
+import system
+
+# bound methods, like the collision handlers a sprite manager keeps,
+# are saved as their object and the method's name
+def reduce_method(method):
+    return getattr, (method.im_self, method.im_func.__name__)
+
+copy_reg.pickle(types.MethodType, reduce_method)
+
+# objects that are never copied into a snapshot. Surfaces not in the
+# image manager, like rendered text, and sounds are kept alongside the
+# buffer and put back as they are, open files can't be captured
+REFERENCE_TYPES = (pygame.Surface, pygame.mixer.Sound, pygame.mask.Mask,
+                   pygame.font.Font)
+UNCAPTURED_TYPES = (file, types.GeneratorType)
+# game attributes that are values rather than objects to share
+PLAIN_TYPES = (int, long, float, bool, basestring, types.NoneType)
+
+def get_random_state():
+    # return the state of the random numbers with the generator's
+    # words packed as bytes, much quicker to pickle than as ints
+    version, words, gauss_next = random.getstate()
+    return version, array('I', words).tostring(), gauss_next
+
+def set_random_state(state):
+    version, data, gauss_next = state
+    words = array('I')
+    words.fromstring(data)
+    random.setstate((version, tuple(words), gauss_next))
+
+class SnapshotError(Exception):
+    """ Raised when a snapshot can't be captured or restored """
+    pass
+
+class Snapshot():
+    """ A simulation captured by SnapshotManager.capture. data is the
+    pickled simulation, names the shared objects it refers to, and
+    constants and references the objects it keeps as they are """
+    def __init__(self, data, names, constants, references, attributes,
+                 ticks):
+        self.data = data
+        self.names = names
+        self.constants = constants
+        self.references = references
+        self.attributes = attributes # game attributes captured
+        self.ticks = ticks # game time it was captured at
+
+    def __len__(self):
+        return len(self.data)
+
+class SnapshotManager():
+    """ Captures a state's attributes, with everything they refer to,
+    the game attributes named in attributes, the game time and the
+    random numbers, and restores them into the same state or a new
+    one of its class.
+    Objects that outlive the state aren't copied: the game and its
+    other attributes are referred to by name, images by ImageManager
+    key and sounds by SoundManager key, so they resolve to whatever
+    is loaded under those keys when the snapshot is restored """
+    def __init__(self, game, attributes):
+        self.game = game
+        self.attributes = tuple(attributes)
+        self.shared = None # (signature, names, pickler memo)
+
+    def get_shared(self, state, attributes):
+        # return the names of the shared objects and a pickler memo
+        # referring to them, the state first. The game's attributes are
+        # shared except those captured. Only rebuilt when the shared
+        # attributes or the loaded images change
+        game = self.game
+        images = game.image_manager.images
+        members = [(name, value) for name, value in sorted(vars(game).items())
+                   if name not in attributes and
+                   not isinstance(value, PLAIN_TYPES)]
+        signature = (tuple(attributes),
+                     tuple([id(value) for name, value in members]),
+                     tuple(map(id, images.values())))
+        if self.shared is None or self.shared[0] != signature:
+            shared = [(('game',), game)]
+            for name, value in members:
+                shared.append((('game', name), value))
+            for key, image in sorted(images.items()):
+                shared.append((('image', key), image))
+                if isinstance(image, list):
+                    for index, frame in enumerate(image):
+                        shared.append((('image', key, index), frame))
+                        if isinstance(frame, list):
+                            for column, tile in enumerate(frame):
+                                shared.append((('image', key, index,
+                                                column), tile))
+            for key, sound in sorted(game.sound_manager.handles.items()):
+                shared.append((('sound', key), sound))
+            names = tuple([('state',)] + [name for name, value in shared])
+            memo = dict()
+            for index, (name, value) in enumerate(shared):
+                memo.setdefault(id(value), (index + 1, value))
+            self.shared = (signature, names, memo)
+        signature, names, memo = self.shared
+        memo = dict(memo)
+        memo[id(state)] = (0, state)
+        return names, memo
+
+    def resolve(self, name, state):
+        # return the object shared under name
+        kind = name[0]
+        if kind == 'state':
+            return state
+        if kind == 'game':
+            if len(name) == 1:
+                return self.game
+            return getattr(self.game, name[1])
+        if kind == 'image':
+            image = self.game.image_manager.images[name[1]]
+            for index in name[2:]:
+                image = image[index]
+            return image
+        return self.game.sound_manager.handles[name[1]]
+
+    def capture(self, state, constants = (), attributes = None):
+        # return a Snapshot of state and the game's simulation.
+        # constants are objects the state never changes, like a
+        # loaded level, which are kept rather than copied. attributes
+        # overrides the game attributes to capture
+        if attributes is None:
+            attributes = self.attributes
+        names, memo = self.get_shared(state, attributes)
+        constants = tuple(constants)
+        for index, value in enumerate(constants):
+            memo[id(value)] = (len(names) + index, value)
+        references = []
+        def keep(value):
+            # objects kept by reference are saved as their index
+            if isinstance(value, REFERENCE_TYPES):
+                references.append(value)
+                return len(references) - 1
+            if isinstance(value, UNCAPTURED_TYPES):
+                raise SnapshotError('cannot capture %r' % value)
+            return None
+
+        buffer = cStringIO.StringIO()
+        pickler = cPickle.Pickler(buffer, cPickle.HIGHEST_PROTOCOL)
+        pickler.memo = memo
+        pickler.inst_persistent_id = keep
+        ticks = system.get_ticks()
+        values = [getattr(self.game, name) for name in attributes]
+        try:
+            pickler.dump((state.__dict__, values, ticks, get_random_state()))
+        except (cPickle.PicklingError, TypeError), message:
+            raise SnapshotError('cannot capture %s: %s' %
+                                (state.__class__.__name__, message))
+        return Snapshot(buffer.getvalue(), names, constants, references,
+                        tuple(attributes), ticks)
+
+    def restore(self, snapshot, state, keep_time = False):
+        # put state and the game back as they were in snapshot. State
+        # is the state captured or one of its class. With keep_time the
+        # game time and random numbers carry on, for restarting from a
+        # snapshot with no timers running rather than going back to it
+        try:
+            objects = [self.resolve(name, state) for name in snapshot.names]
+        except (KeyError, AttributeError, IndexError), message:
+            raise SnapshotError('cannot restore, %s is not loaded' % message)
+        unpickler = cPickle.Unpickler(cStringIO.StringIO(snapshot.data))
+        unpickler.memo = dict(enumerate(objects + list(snapshot.constants)))
+        unpickler.persistent_load = snapshot.references.__getitem__
+        state_attributes, values, ticks, random_state = unpickler.load()
+
+        state.__dict__.update(state_attributes)
+        for name, value in zip(snapshot.attributes, values):
+            setattr(self.game, name, value)
+        if not keep_time:
+            system.CLOCK.set(ticks)
+            set_random_state(random_state)
+
+class RewindBuffer():
+    """ Ring of the latest capacity snapshots, pushing
+    one when full drops the oldest """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.snapshots = [] # oldest first
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def push(self, snapshot):
+        self.snapshots.append(snapshot)
+        if len(self.snapshots) > self.capacity:
+            del self.snapshots[0]
+
+    def pop(self):
+        # remove and return the latest snapshot, None if empty
+        if self.snapshots:
+            return self.snapshots.pop()
+        return None
+
+    def clear(self):
+        del self.snapshots[:]
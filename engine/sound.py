@@ -13,14 +13,83 @@
 import pygame
 from pygame.locals import *
 import os
+import cStringIO
+import threading
+import Queue
+import timeit
 import resource_path
 
+MUSIC_CHANNELS = 2  # mixer channels kept for cross-faded music
+
+class MixerSettings():
+    """ Settings for pygame's mixer, applied with pre_init before
+        pygame.init().  The buffer size sets most of the delay between
+        playing a sound and hearing it, smaller buffers are quicker but
+        can underrun (crackle) on slower machines
+        frequency - sample rate in Hz
+        size - bits per sample, negative for signed samples
+        channels - output channels, 1 for mono, 2 for stereo
+        buffer - samples per mixer buffer, a power of 2
+        voices - mixer channels used for sound effects
+        measure_latency - log the delay from the game step that plays
+                          a sound to the sound being handed to the mixer """
+    def __init__(self, frequency = 44100, size = -16, channels = 2,
+                 buffer = 2048, voices = 8, measure_latency = False):
+        self.frequency = frequency
+        self.size = size
+        self.channels = channels
+        self.buffer = buffer
+        self.voices = voices
+        self.measure_latency = measure_latency
+
+    def pre_init(self):
+        # call before pygame.init()
+        pygame.mixer.pre_init(self.frequency, self.size, self.channels,
+                              self.buffer)
+
+    def buffer_latency(self):
+        # m/s of audio held in one mixer buffer
+        return 1000.0 * self.buffer / self.frequency
+
 class SoundManager():
     """ This class handles the loading and playback of sounds
         and music.  All sound effects are stored in a single dictionary.
-        All music is streamed directly from the file """
-    def __init__(self):
+        Music is read into memory ahead of time by a background loader
+        and streamed from there, or played from a decoded sound when
+        cross-fading between songs.
+        Sound effects are played through a voice manager that limits how
+        many copies of each sound can play at once, how soon a sound can
+        be retriggered, and which sounds may steal a channel when all
+        channels are busy.
+        Between begin_events and flush_events plays are collected in a
+        SoundEventQueue and each sound is played once on flush, louder
+        by event_boost for every duplicate """
+    def __init__(self, settings = None):
+        if settings is None:
+            settings = MixerSettings()
+        self.settings = settings
         self.sounds = dict()  # dictionary of all sound effects loaded
+        self.handles = dict()  # ManagedSound for each sound, by key
+        self.limits = dict()  # VoiceLimits for each sound, by key
+        self.channels = []  # mixer channels used for sound effects
+        self.voices = []  # (key, priority, start time) per channel
+        self.requested = dict()  # plays asked for, by key
+        self.mixed = dict()  # plays that reached the mixer, by key
+        self.volumes = dict()  # volume of each sound, by key
+        self.event_queue = SoundEventQueue()
+        self.collecting = False  # True between begin/flush_events
+        self.event_boost = 0.25  # volume added per merged duplicate
+        self.music_channels = []  # channels for cross-faded music
+        self.set_num_channels(settings.voices)
+        self.step_started = None  # timer value at start of the game step
+        self.latency_probe = None
+        if settings.measure_latency:
+            self.latency_probe = LatencyProbe(settings.buffer_latency())
+        self.music_loader = MusicLoader()
+        self.current_music = None  # MusicTrack currently playing
+        self.music_channel = None  # music channel in use, None if streaming
+        self.pending_music = None  # (track, loops, fade) waiting on a load
+        self.music_paused = False
 
     def load(self, filename, volume = 0.5):
         # load a sound for playback
@@ -34,42 +103,415 @@ class SoundManager():
         sound.set_volume(volume)
         return sound
 
-    def load_sound(self, filename, key, volume = 0.5):
-        # loads a single image into the image manager
-        sound = self.load(filename, volume)
+    def load_sound(self, filename, key, volume = 0.5, max_voices = None,
+                   priority = 0, min_interval = 0):
+        # loads a single sound into the sound manager
+        # max_voices - copies of the sound that can play at once,
+        #              None for no limit
+        # priority - sounds can steal channels from sounds with
+        #            an equal or lower priority
+        # min_interval - m/s before the sound can be played again
+        # the sound itself is kept at full volume, volume is applied
+        # to the channel it plays on so merged plays can be boosted
+        sound = self.load(filename, 1.0)
         self.sounds[key] = sound
+        self.volumes[key] = volume
+        self.handles[key] = ManagedSound(self, key, sound)
+        self.limits[key] = VoiceLimits(max_voices, priority, min_interval)
+        self.requested[key] = 0
+        self.mixed[key] = 0
 
     def get_sound(self, key):
-        return self.sounds[key]
+        # returns a handle for the sound, calling play() on it
+        # goes through the voice manager
+        return self.handles[key]
 
     def unload_sound(self, key):
         # remove a sound from the sound manager
         del self.sounds[key]
+        del self.handles[key]
+        del self.limits[key]
+        del self.volumes[key]
+
+    def set_num_channels(self, count):
+        # set the number of mixer channels available to sound effects,
+        # MUSIC_CHANNELS more are added and reserved for music
+        pygame.mixer.set_num_channels(count + MUSIC_CHANNELS)
+        pygame.mixer.set_reserved(MUSIC_CHANNELS)
+        self.music_channels = [pygame.mixer.Channel(i) 
+                               for i in xrange(MUSIC_CHANNELS)]
+        self.channels = [pygame.mixer.Channel(i) 
+                         for i in xrange(MUSIC_CHANNELS,
+                                         count + MUSIC_CHANNELS)]
+        self.voices = [None] * count
+
+    def play(self, key):
+        # play the sound effect key within its voice limits
+        # returns the channel it is playing on, or None if dropped
+        # or collected for flush_events
+        self.requested[key] += 1
+        if self.collecting:
+            self.event_queue.add(key, self.step_started)
+            return None
+        return self.mix(key, 1.0, self.step_started)
+
+    def mark_step(self):
+        # called by the game loop at the start of each game step,
+        # sounds played during the step are timed from here
+        if self.latency_probe is not None:
+            self.step_started = timeit.default_timer()
+
+    def begin_events(self):
+        # collect sound effect plays until flush_events is called
+        self.collecting = True
+
+    def flush_events(self):
+        # play each sound collected since begin_events once, boosting
+        # the volume for each duplicate that was merged into it
+        self.collecting = False
+        for key, count, triggered in self.event_queue.drain():
+            self.mix(key, 1.0 + self.event_boost * (count - 1), triggered)
+
+    def mix(self, key, boost = 1.0, triggered = None):
+        # start the sound on a channel, applying the voice limits
+        # boost - scales the sound's volume, capped at full volume
+        # triggered - timer value of the step that played the sound
+        limits = self.limits[key]
+        current_time = pygame.time.get_ticks()
+
+        # too soon after the last play of the same sound
+        if current_time - limits.last_play < limits.min_interval:
+            return None
+
+        # forget voices that have finished, count this sound's voices
+        playing = []
+        free = None
+        for i in xrange(len(self.channels)):
+            if self.voices[i] is not None and not self.channels[i].get_busy():
+                self.voices[i] = None
+            if self.voices[i] is None:
+                if free is None and not self.channels[i].get_busy():
+                    free = i
+            elif self.voices[i][0] == key:
+                playing.append(i)
+
+        if limits.max_voices is not None and \
+           len(playing) >= limits.max_voices:
+            # at the limit, restart the oldest copy of this sound
+            index = self.oldest(playing)
+        elif free is not None:
+            index = free
+        else:
+            # all channels busy, steal the oldest voice of the lowest
+            # priority that is not above this sound's priority
+            index = self.steal(limits.priority)
+            if index is None:
+                return None
 
-    def play_music(self, filename, loops = -1):
+        channel = self.channels[index]
+        channel.play(self.sounds[key])
+        channel.set_volume(min(1.0, self.volumes[key] * boost))
+        self.voices[index] = (key, limits.priority, current_time)
+        limits.last_play = current_time
+        self.mixed[key] += 1
+        if self.latency_probe is not None and triggered is not None:
+            self.latency_probe.add(timeit.default_timer() - triggered)
+        return channel
+
+    def oldest(self, indices):
+        # returns the index of the channel whose voice started first
+        oldest = indices[0]
+        for i in indices:
+            if self.voices[i][2] < self.voices[oldest][2]:
+                oldest = i
+        return oldest
+
+    def steal(self, priority):
+        # returns the channel index to steal for a sound of priority,
+        # or None if every voice outranks it
+        candidates = []
+        for i in xrange(len(self.voices)):
+            voice = self.voices[i]
+            if voice is not None and voice[1] <= priority:
+                candidates.append(i)
+        if not candidates:
+            return None
+        lowest = min([self.voices[i][1] for i in candidates])
+        return self.oldest([i for i in candidates 
+                            if self.voices[i][1] == lowest])
+
+    def get_stats(self):
+        # returns {key : (plays requested, plays mixed)}
+        stats = dict()
+        for key in self.requested:
+            stats[key] = (self.requested[key], self.mixed[key])
+        return stats
+
+    def reset_stats(self):
+        for key in self.requested:
+            self.requested[key] = 0
+            self.mixed[key] = 0
+
+    def update(self):
+        # call once per game loop, starts music that was
+        # waiting on the background loader
+        if self.pending_music is not None:
+            track, loops, fade = self.pending_music
+            if track.ready:
+                self.pending_music = None
+                if track.error is not None:
+                    print 'Cannot play music:', track.filename, track.error
+                else:
+                    self.start_music(track, loops, fade)
+
+    def prefetch_music(self, filename, decode = False):
+        # read a song into memory on the background loader so it
+        # can be switched to without waiting on the disk.
+        # decode - also decode the song so it can be cross-faded to
+        self.music_loader.request(filename, decode)
+
+    def play_music(self, filename, loops = -1, fade = 0):
         # play selected music, if already playing, stop current song, play new one
         # loops song infinitely by default
-        try:
-            song = os.path.join('res', 'music', filename)
-        except pygame.error, message:
-            print 'Cannot play music: ', filename
-            raise SystemExit, message
-        if song:
-            if pygame.mixer.music.get_busy == False:
-                pygame.mixer.music.load(song)
-                pygame.mixer.music.play(loops)
+        # songs are loaded in the background, if the song has not been
+        # prefetched it starts as soon as the loader has read it.
+        # fade - m/s to cross-fade from the current song, only used if
+        #        the song was prefetched with decode
+        track = self.music_loader.request(filename, False)
+        self.pending_music = (track, loops, fade)
+        self.music_paused = False
+        self.update()
+
+    def start_music(self, track, loops, fade):
+        # switch to track, which has been loaded
+        if fade > 0 and track.sound is not None:
+            # fade the current song out and the new one in
+            # on the other music channel
+            self.fade_out_music(fade)
+            if self.music_channel is self.music_channels[0]:
+                channel = self.music_channels[1]
             else:
-                pygame.mixer.music.stop()
-                pygame.mixer.music.load(song)
-                pygame.mixer.music.play(loops)
+                channel = self.music_channels[0]
+            channel.play(track.sound, loops, fade_ms = fade)
+            self.music_channel = channel
+        else:
+            # stream the song from memory
+            self.stop_music()
+            pygame.mixer.music.load(cStringIO.StringIO(track.data))
+            pygame.mixer.music.play(loops)
+        # keep the track and its data around while it plays
+        self.current_music = track
+        self.music_loader.keep(track.filename)
+        if self.music_paused:
+            self.music_control("pause")
+
+    def stop_music(self):
+        # stop the music stream and any music channels
+        pygame.mixer.music.stop()
+        for channel in self.music_channels:
+            channel.stop()
+        self.music_channel = None
+
+    def fade_out_music(self, fade_time):
+        # fade out the music stream and any music channels
+        pygame.mixer.music.fadeout(fade_time)
+        for channel in self.music_channels:
+            if channel.get_busy():
+                channel.fadeout(fade_time)
 
     def music_control(self, control, fade_time = 1000):
         # various music controls
         if control == "stop":
-                pygame.mixer.music.stop()
+                self.pending_music = None
+                self.music_paused = False
+                self.stop_music()
         elif control == "pause":
                 pygame.mixer.music.pause()
+                for channel in self.music_channels:
+                    channel.pause()
+                self.music_paused = True
         elif control == "unpause":
                 pygame.mixer.music.unpause()
+                for channel in self.music_channels:
+                    channel.unpause()
+                self.music_paused = False
         elif control == "fade":
-                pygame.mixer.music.fadeout(fade_time)
+                self.pending_music = None
+                self.fade_out_music(fade_time)
+
+class MusicTrack():
+    """ A song read into memory by the music loader. ready is set
+        once the loader is done with it, error is set if it failed """
+    def __init__(self, filename):
+        self.filename = filename
+        relative = os.path.join('res', 'music', filename)
+        self.path = resource_path.resource_path(relative)
+        self.data = None  # file contents
+        self.sound = None  # decoded sound, for cross-fading
+        self.decode = False
+        self.ready = False
+        self.error = None
+
+    def load(self):
+        # read and, if asked for, decode the song.
+        # called on the loader thread
+        try:
+            if self.data is None:
+                music_file = open(self.path, 'rb')
+                try:
+                    self.data = music_file.read()
+                finally:
+                    music_file.close()
+            if self.decode and self.sound is None:
+                self.sound = pygame.mixer.Sound(file =
+                                               cStringIO.StringIO(self.data))
+        except (IOError, pygame.error), message:
+            self.error = message
+        self.ready = True
+
+class MusicLoader():
+    """ Loads songs on a background thread. Keeps up to max_tracks
+        songs in memory, dropping the oldest ones that are not playing """
+    def __init__(self, max_tracks = 4):
+        self.tracks = dict()  # filename : MusicTrack
+        self.order = []  # filenames, oldest request first
+        self.max_tracks = max_tracks
+        self.playing = None  # filename of the song that must be kept
+        self.jobs = Queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def request(self, filename, decode):
+        # returns the track for filename, queueing it for loading
+        # if it hasn't been loaded or needs decoding
+        self.lock.acquire()
+        try:
+            track = self.tracks.get(filename)
+            if track is None:
+                track = MusicTrack(filename)
+                self.tracks[filename] = track
+                load = True
+            else:
+                self.order.remove(filename)
+                load = decode and not track.decode
+            self.order.append(filename)
+            if decode:
+                track.decode = True
+            self.evict()
+        finally:
+            self.lock.release()
+
+        if load:
+            self.start()
+            self.jobs.put(track)
+        return track
+
+    def keep(self, filename):
+        # never drop the song that is playing
+        self.playing = filename
+
+    def evict(self):
+        # drop the oldest loaded songs over max_tracks
+        for filename in list(self.order):
+            if len(self.order) <= self.max_tracks:
+                break
+            track = self.tracks[filename]
+            if track.ready and filename != self.playing:
+                self.order.remove(filename)
+                del self.tracks[filename]
+
+    def start(self):
+        # start the loader thread the first time it is needed
+        if self.thread is None:
+            self.thread = threading.Thread(target = self.run)
+            self.thread.setDaemon(True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            track = self.jobs.get()
+            track.load()
+
+class VoiceLimits():
+    """ Voice settings for a single sound effect """
+    def __init__(self, max_voices = None, priority = 0, min_interval = 0):
+        self.max_voices = max_voices
+        self.priority = priority
+        self.min_interval = min_interval
+        self.last_play = -min_interval  # time of last play reaching the mixer
+
+class SoundEventQueue():
+    """ Sound effect plays collected over a game step. Each sound is
+        kept once, with a count of how many times it was played """
+    def __init__(self):
+        self.counts = dict()  # key : number of plays
+        self.triggered = dict()  # key : timer value of the first play
+        self.order = []  # keys in the order they were first played
+
+    def add(self, key, triggered = None):
+        if key in self.counts:
+            self.counts[key] += 1
+        else:
+            self.counts[key] = 1
+            self.triggered[key] = triggered
+            self.order.append(key)
+
+    def drain(self):
+        # returns [(key, count, triggered)] in play order and
+        # empties the queue
+        events = [(key, self.counts[key], self.triggered[key]) 
+                  for key in self.order]
+        self.counts = dict()
+        self.triggered = dict()
+        self.order = []
+        return events
+
+class LatencyProbe():
+    """ Collects the delays between the game step that plays a sound
+        and the sound reaching the mixer, and prints a summary every
+        report_every sounds.  The mixer buffer adds buffer_latency m/s
+        on top of that before the sound is heard """
+    def __init__(self, buffer_latency, report_every = 100):
+        self.buffer_latency = buffer_latency
+        self.report_every = report_every
+        self.delays = []  # seconds
+
+    def add(self, delay):
+        self.delays.append(delay)
+        if len(self.delays) >= self.report_every:
+            self.report()
+            self.delays = []
+
+    def report(self):
+        if not self.delays:
+            return
+        delays = sorted(self.delays)
+        average = 1000.0 * sum(delays) / len(delays)
+        worst = 1000.0 * delays[-1]
+        print 'Audio latency: step to mixer avg %.2f ms, max %.2f ms,' \
+              ' mixer buffer %.1f ms (%d sounds)' % (average, worst,
+                                                  self.buffer_latency,
+                                                  len(delays))
+
+class ManagedSound():
+    """ Stands in for a pygame Sound. play() is passed to the sound
+        manager so the sound's voice limits are applied """
+    def __init__(self, manager, key, sound):
+        self.manager = manager
+        self.key = key
+        self.sound = sound
+
+    def play(self):
+        return self.manager.play(self.key)
+
+    def stop(self):
+        self.sound.stop()
+
+    def set_volume(self, volume):
+        self.manager.volumes[self.key] = volume
+
+    def get_volume(self):
+        return self.manager.volumes[self.key]
+
+    def get_length(self):
+        return self.sound.get_length()
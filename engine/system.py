@@ -1,7 +1,7 @@
 #-------------------------------------------------------------------------------
 # Name:        System
 # Purpose:     Component of Engine, contains the display class, input manager
-#              state class, and state manager
+#              state class, state manager and the game clock
 # Author:      Will Taplin
 #
 # Created:     03/07/2011
@@ -45,6 +45,36 @@ least 1/60 second.  """
 SCREEN_RECT = pygame.rect.Rect(0,0,320,240)
 TIMESTEP = 1 / 60.0
 
+# the bound buttons, in the order of their bits in the
+# masks from InputManager.get_state
+BUTTONS = ('UP', 'DOWN', 'LEFT', 'RIGHT', 'SELECT',
+           'START', 'B', 'A', 'Y', 'X')
+
+class GameClock():
+    """ The time the game runs on, in m/s. Game.step reads pygame's
+    clock once per step, so everything in a step sees the same time,
+    or a replay sets the times it recorded """
+    def __init__(self):
+        self.ticks = 0
+        self.offset = 0 # pygame's time less the game time
+
+    def tick(self):
+        # move the game time on to pygame's time
+        self.ticks = pygame.time.get_ticks() - self.offset
+        return self.ticks
+
+    def set(self, ticks):
+        # put the game time back or forward to ticks,
+        # it runs on from there
+        self.offset = pygame.time.get_ticks() - ticks
+        self.ticks = ticks
+
+CLOCK = GameClock()
+
+def get_ticks():
+    # the game time in m/s, use instead of pygame.time.get_ticks
+    return CLOCK.ticks
+
 class Display():
     """ This class handles the initialization of pygame, the window,
         the drawing buffer.  It also handles fullscreen and window toggling
@@ -161,6 +191,9 @@ class InputManager():
         self.pressed = {'keys' : [], 'buttons' : [], 'dpad' : [], 'stick' : []}
         self.config_mode = False
         self.input_enabled = True
+        # (held, pressed) button masks replacing the devices while
+        # a replay plays, see set_state
+        self.resolved = None
         self.set = [(-1, 1), (1, 1), (1, -1), (-1, -1)]
         self.gamepad_name = None
         if pygame.joystick.get_count() > 0: # if gamepad plugged in
@@ -274,8 +307,31 @@ class InputManager():
                     new_button = 'up'
         return new_button
 
+    def get_state(self):
+        # return the bound buttons held and pressed as masks,
+        # bit n for BUTTONS[n]
+        held = 0
+        pressed = 0
+        for bit, button in enumerate(BUTTONS):
+            if self.is_held(button):
+                held |= 1 << bit
+            if self.is_pressed(button):
+                pressed |= 1 << bit
+        return held, pressed
+
+    def set_state(self, held, pressed):
+        # answer is_held and is_pressed from the masks held and
+        # pressed, as get_state returns them, instead of the devices.
+        # None for held goes back to the devices
+        if held is None:
+            self.resolved = None
+        else:
+            self.resolved = (held, pressed)
+
     def is_pressed(self, button):
         # returns true if button is pressed
+        if self.resolved is not None:
+            return bool(self.resolved[1] & 1 << BUTTONS.index(button))
         if self.redefined:  # if user has defined new controls
             if button in self.user_bound.iterkeys():
                 values = self.user_bound[button]
@@ -298,6 +354,8 @@ class InputManager():
 
     def is_held(self, button):
         # returns true if a button is being held
+        if self.resolved is not None:
+            return bool(self.resolved[0] & 1 << BUTTONS.index(button))
         if self.redefined:
             if button in self.user_bound.iterkeys():
                 values = self.user_bound[button]
@@ -437,7 +495,7 @@ class State():
 
         # handle transition animations 
         if self.transitioning:
-            self.transitioning = self.transition.update(pygame.time.get_ticks())
+            self.transitioning = self.transition.update(get_ticks())
 
         # transition is done or non-existant and state is set to exit,
         # indicate the state has finished exiting and new state can begin
@@ -451,14 +509,18 @@ class State():
 
 class Game():
     """ game class - Contains all managers, initializes pygame
-        and runs a game loop """
-    def __init__(self):
-        pygame.mixer.pre_init(44100, -16, 2, 2048)
+        and runs a game loop
+        mixer_settings - sound.MixerSettings for the mixer, the defaults
+                         if None """
+    def __init__(self, mixer_settings = None):
+        if mixer_settings is None:
+            mixer_settings = sound.MixerSettings()
+        mixer_settings.pre_init()
         pygame.init()
         self.paused = False
         self.display = Display()
         self.image_manager = graphics.ImageManager()
-        self.sound_manager = sound.SoundManager()
+        self.sound_manager = sound.SoundManager(mixer_settings)
         self.menu_manager = gui.MenuManager()
         self.input_manager = InputManager()
         self.states = []
@@ -466,6 +528,8 @@ class Game():
         self.clock = pygame.time.Clock()
         self.accumulator = 0.0
         self.alpha = 0.0
+        self.recorder = None # replay.InputRecorder saving the input
+        self.replay = None # replay.Replay playing in place of the input
 
     def set_caption(self, caption):
         # set the window title bar to caption
@@ -510,6 +574,32 @@ class Game():
            draw_pos = current
         return draw_pos
 
+    def step(self):
+        # run one TIMESTEP of the game: read the clock and the input,
+        # recording or replaying them, and pass them to the current state
+        # process input events, a replay then replaces the buttons
+        # and time with the recorded ones
+        self.input_manager.process_input()
+        if self.replay is not None:
+            if self.replay.finished():
+                print 'Replay finished'
+                self.quit()
+            self.replay.play_step(self.input_manager, CLOCK)
+        else:
+            CLOCK.tick()
+        if self.recorder is not None:
+            self.recorder.record_step(self.input_manager, CLOCK.ticks)
+
+        # start any music that has finished loading
+        self.sound_manager.update()
+
+        # pass input to state if not transitioning
+        current_state = self.get_current_state()
+        self.sound_manager.mark_step()
+        if not current_state.transitioning:
+            current_state.handle_input()
+        current_state.update()
+
     def run(self):
         current_state = self.get_current_state()
         while(current_state):
@@ -524,18 +614,11 @@ class Game():
             # add frame time to accumulator
             self.accumulator += tick
 
-            # process input events
-            self.input_manager.process_input()
-
-            # pass input to state if not transitioning
-            if not current_state.transitioning:
-                current_state.handle_input()
-
-            # update the game in TIMESTEP increments
-            # if frame time was long, update as many times as needed 
-            # to catch up
+            # update the game in TIMESTEP increments, with the input
+            # read each step. If frame time was long, update as many
+            # times as needed to catch up
             while self.accumulator >= TIMESTEP:
-                current_state.update()
+                self.step()
                 self.accumulator -= TIMESTEP
             
             # store alpha for interpolated draws
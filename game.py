@@ -10,27 +10,34 @@
 #----------------------------------------------------------------------------
 #!/usr/bin/env python
 import pygame
+import random
 import engine
 import states
 import player
 import hud
+import enemies
 
 from engine.system import SCREEN_RECT
 
 class PsmGame(engine.system.Game):
 
-    def __init__(self):
-        engine.system.Game.__init__(self)
+    def __init__(self, mixer_settings = None):
+        engine.system.Game.__init__(self, mixer_settings)
         self.set_caption("Protostriker M")
         self.display.init()
         self.image_manager.load_font('prstartk.ttf', 8)
-        self.font = self.image_manager.get_font()
+        # draw all text from a glyph cache of the loaded font
+        self.font = engine.gui.BitmapFont(self.image_manager.get_font())
         self.text_color = (252,248,252)
         self.load_content()
         pygame.display.set_icon(self.image_manager.get_image('icon'))
         self.current_level = 1
         self.boss_level = False
         self.boss_level_triggered = False
+        # confirm hitbox hits with the sprites' image masks
+        self.pixel_collisions = False
+        # read levels a little ahead of the viewport as they play
+        self.stream_levels = False
         self.hud = hud.GameHud(self, (320, 32), (0,0,0))
         self.game_world = pygame.rect.Rect(0, SCREEN_RECT.top + self.hud.height,
                                            320, SCREEN_RECT.height - self.hud.height)
@@ -43,10 +50,55 @@ class PsmGame(engine.system.Game):
                                                       SCREEN_RECT.height - self.hud.height - 32)
         self.player = player.Player(self, 16, 112, 
                                     self.image_manager.get_image('ship'))
+        # one enemy factory for the whole game, so each type's prototype
+        # is built once and snapshots can share it
+        self.enemy_factory = enemies.EnemyFactory(self)
+        # snapshots of the simulation, for level restarts and rewinding.
+        # The player and level flags are captured with the level
+        self.snapshots = engine.snapshot.SnapshotManager(self,
+                             ['player', 'current_level', 'boss_level',
+                              'boss_level_triggered', 'paused'])
+        self.rewind = None # engine.snapshot.RewindBuffer when rewind is on
      
         self.push_state(states.TitleScreenState(self), 
                         engine.graphics.FadeAnimation("in"))
 
+    def start_level(self, level, seed):
+        # start playing level straight away, skipping the menus,
+        # with the random numbers seeded with seed
+        random.seed(seed)
+        self.current_level = level
+        self.change_state(states.GameState(self))
+
+    def record(self, level, seed = None):
+        # start playing level, recording the input so it can be
+        # played back the same with play_replay
+        if seed is None:
+            seed = random.randrange(1 << 32)
+        settings = {'pixel_collisions': int(self.pixel_collisions),
+                    'rewind': int(self.rewind is not None)}
+        self.recorder = engine.replay.InputRecorder(seed, level, settings)
+        self.start_level(level, seed)
+
+    def play_replay(self, replay):
+        # start replay, an engine.replay.Replay, from its level
+        # with the settings it was recorded with
+        self.pixel_collisions = bool(replay.settings.get('pixel_collisions'))
+        if replay.settings.get('rewind'):
+            self.enable_rewind()
+        self.replay = replay
+        self.start_level(replay.level, replay.seed)
+
+    def enable_rewind(self):
+        # keep the last few seconds of each level, holding
+        # SELECT plays them backwards. Streamed levels read from an
+        # open file, which snapshots can't capture, so raises
+        # engine.snapshot.SnapshotError with stream_levels on
+        if self.stream_levels:
+            raise engine.snapshot.SnapshotError('streamed levels can\'t '
+                                                'be rewound')
+        self.rewind = engine.snapshot.RewindBuffer(states.REWIND_SNAPSHOTS)
+
     def next_level(self):
         # change to a new level and return False if there are more levels
         # otherwise return true
@@ -123,28 +175,43 @@ class PsmGame(engine.system.Game):
         self.image_manager.load_sheet('boss.bmp', 'boss', 64, 96, False, -1)
 
         # load sounds
+        # ui and pickup sounds outrank weapon and enemy sounds when
+        # channels run out, rapid fire sounds are limited to a couple
+        # of voices so they can't flood the mixer
         self.sound_manager.load_sound('cursor.wav', 'cursor',
-                                           volume = 0.2)
+                                           volume = 0.2, max_voices = 1,
+                                           priority = 2)
         self.sound_manager.load_sound('select.wav', 'select',
-                                           volume = 0.2)
-        self.sound_manager.load_sound('blip.wav', 'blip', volume = 0.1)
-        self.sound_manager.load_sound('pause.wav', 'pause')
+                                           volume = 0.2, max_voices = 1,
+                                           priority = 2)
+        self.sound_manager.load_sound('blip.wav', 'blip', volume = 0.1,
+                                      max_voices = 1, priority = 1)
+        self.sound_manager.load_sound('pause.wav', 'pause', max_voices = 1,
+                                      priority = 2)
         self.sound_manager.load_sound('enemy_exp.wav','en_exp',
-                                           volume = 0.4)
+                                           volume = 0.4, max_voices = 3,
+                                           priority = 1, min_interval = 20)
         self.sound_manager.load_sound('player_exp.wav', 'pl_exp',
-                                           volume = 0.4)
+                                           volume = 0.4, max_voices = 1,
+                                           priority = 3)
         self.sound_manager.load_sound('laser.wav', 'laser',
-                                           volume = 0.1)
+                                           volume = 0.1, max_voices = 2,
+                                           min_interval = 30)
         self.sound_manager.load_sound('hit.wav', 'hit',
-                                           volume = 0.4)
+                                           volume = 0.4, max_voices = 2,
+                                           min_interval = 30)
         self.sound_manager.load_sound('spreader.wav', 'spreader',
-                                      volume = 0.2)
+                                      volume = 0.2, max_voices = 2,
+                                      min_interval = 30)
         self.sound_manager.load_sound('laserbeam.wav', 'laserbeam',
-                                      volume = 0.1)
-        self.sound_manager.load_sound('powerup.wav', 'powerup', volume = 0.5)
+                                      volume = 0.1, max_voices = 1)
+        self.sound_manager.load_sound('powerup.wav', 'powerup', volume = 0.5,
+                                      max_voices = 1, priority = 2)
         self.sound_manager.load_sound('changeweapon.wav', 'changeweapon',
-                                      volume = 0.5)
-        self.sound_manager.load_sound('nohit.wav', 'nohit', volume = 0.4)
+                                      volume = 0.5, max_voices = 1,
+                                      priority = 2)
+        self.sound_manager.load_sound('nohit.wav', 'nohit', volume = 0.4,
+                                      max_voices = 1, min_interval = 30)
 
         
         
@@ -28,9 +28,11 @@ class ScoreElement(engine.gui.HudElement):
     def __init__(self, game, size, pos, color):
         engine.gui.HudElement.__init__(self, game, size, pos, color)
         
-    def update(self, *args):
-        engine.gui.HudElement.update(self)
+    def get_values(self, *args):
+        player = args[0]
+        return player.score
 
+    def redraw(self, *args):
         player = args[0]
 
         # append leading zeros based on to always show score
@@ -59,8 +61,11 @@ class WeaponNameElement(engine.gui.HudElement):
     def __init__(self, game, size, pos, color):
         engine.gui.HudElement.__init__(self, game, size, pos, color)
         
-    def update(self, *args):
-        engine.gui.HudElement.update(self)
+    def get_values(self, *args):
+        player = args[0]
+        return player.current_weapon.name
+
+    def redraw(self, *args):
         player = args[0]
 
         # get players current weapon name, build string and render
@@ -75,8 +80,11 @@ class LevelElement(engine.gui.HudElement):
     def __init__(self, game, size, pos, color):
         engine.gui.HudElement.__init__(self, game, size, pos, color)
 
-    def update(self, *args):
-        engine.gui.HudElement.update(self)
+    def get_values(self, *args):
+        game = args[1]
+        return game.current_level
+
+    def redraw(self, *args):
         game = args[1]
 
         # get the game's current level, build string and render
@@ -103,8 +111,11 @@ class SpeedElement(engine.gui.HudElement):
         level = difference / player.speed_increment
         return level
 
-    def update(self, *args):
-        engine.gui.HudElement.update(self)
+    def get_values(self, *args):
+        player = args[0]
+        return self.calc_level(player)
+
+    def redraw(self, *args):
         player = args[0]
 
         # get the player's speed level
@@ -149,8 +160,11 @@ class LivesElement(engine.gui.HudElement):
         engine.gui.HudElement.__init__(self, game, size, pos, color)
         self.image = game.image_manager.get_image('smallship')
 
-    def update(self, *args):
-        engine.gui.HudElement.update(self)
+    def get_values(self, *args):
+        player = args[0]
+        return player.lives
+
+    def redraw(self, *args):
         player = args[0]
 
         # get the number of lives remaining,
@@ -0,0 +1,167 @@
+#-------------------------------------------------------------------------------
+# Name:        level_generator.py
+# Purpose:     Writes synthetic level files for load testing, with a
+#              chosen length, density, enemy type mix and power up ratio,
+#              or one of the PRESETS for the worst cases.
+#              Run with the file to write and any options, e.g.
+#              python level_generator.py --preset same_x same_x.txt
+#
+# Author:      Will Taplin
+#
+# Created:     17/12/2011
+# Copyright:   (c) Owner 2011
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+import random
+import optparse
+
+import levels
+import enemies
+
+# enemy type : weight, the mix of the hand made levels
+DEFAULT_MIX = {'enemy_01': 210, 'enemy_02': 93, 'enemy_03': 78,
+               'enemy_04': 14, 'enemy_05': 17, 'enemy_06': 15,
+               'enemy_07': 44, 'enemy_08': 66, 'enemy_09': 24,
+               'enemy_10': 8, 'enemy_11': 43, 'enemy_12': 90,
+               'enemy_13': 18, 'enemy_14': 36, 'enemy_15': 2}
+
+# enemies that sit on the top or bottom edge of the screen,
+# the rest fly anywhere between
+EDGE_TYPES = ('enemy_04',)
+EDGE_Y = (0, 224)
+FLYING_Y = range(32, 224, 16)
+
+# where the spawns of the hand made levels start and how far they run
+LEVEL_START = 864
+LEVEL_LENGTH = 9520
+
+# name : generate_level arguments, for cases the hand made levels
+# never reach
+PRESETS = {
+    # every enemy type, twenty enemies a screen
+    'dense': {'density': 20.0},
+    # 500 enemies spawning on the same frame
+    'same_x': {'count': 500, 'length': 0},
+    # nothing but enemy_05, which bursts into shrapnel
+    'shrapnel_storm': {'mix': {'enemy_05': 1}, 'density': 8.0},
+    # a level ten times the usual length
+    'long': {'length': LEVEL_LENGTH * 10},
+}
+
+def generate_level(count = None, density = 4.0, length = LEVEL_LENGTH,
+                   start = LEVEL_START, mix = None, powerup_ratio = 0.1,
+                   seed = 1):
+    # return a list of (enemy type, x, y, has_powerup) spawns sorted by x.
+    # Spawns are spread evenly at random over length pixels from start,
+    # density per 320 pixel screen unless count is given. Types are
+    # picked by the weights in mix, DEFAULT_MIX if None, and powerup_ratio
+    # of the enemies carry a power up
+    if mix is None:
+        mix = DEFAULT_MIX
+    if count is None:
+        count = int(density * length / 320)
+    rand = random.Random(seed)
+    types = sorted(mix)
+    total = float(sum(mix[enemy_type] for enemy_type in types))
+
+    spawns = []
+    for spawn in xrange(count):
+        pick = rand.random() * total
+        for enemy_type in types:
+            pick -= mix[enemy_type]
+            if pick < 0:
+                break
+        if enemy_type in EDGE_TYPES:
+            y = rand.choice(EDGE_Y)
+        else:
+            y = rand.choice(FLYING_Y)
+        spawns.append((enemy_type, start + rand.randint(0, length), y,
+                       rand.random() < powerup_ratio))
+    spawns.sort(key = lambda spawn: spawn[1])
+    return spawns
+
+def format_spawn(spawn):
+    # return spawn as a line of a level file, laid
+    # out like the hand made levels
+    enemy_type, x, y, has_powerup = spawn
+    return 'begin_enemy    type%12s   x%10d   y%10d   ' \
+           'has_powerup%9s    end_enemy\n' % (enemy_type, x, y, has_powerup)
+
+def write_level(filename, spawns, end = None):
+    # write spawns to level file filename, ending the
+    # level at level pos end if given
+    level = open(filename, 'w')
+    try:
+        level.writelines([format_spawn(spawn) for spawn in spawns])
+        if end is not None:
+            level.write('level_end%14d\n' % end)
+    finally:
+        level.close()
+
+def get_mix(option, opt_str, value, parser):
+    # read --mix, enemy types and weights as enemy_01:3,enemy_05:1
+    mix = dict()
+    for item in value.split(','):
+        enemy_type, colon, weight = item.partition(':')
+        if enemy_type not in enemies.ENEMY_TYPES:
+            raise optparse.OptionValueError('unknown enemy type: %s' %
+                                            enemy_type)
+        try:
+            mix[enemy_type] = float(weight or 1)
+        except ValueError:
+            raise optparse.OptionValueError('bad weight for %s: %s' %
+                                            (enemy_type, weight))
+    parser.values.mix = mix
+
+def main():
+    parser = optparse.OptionParser(usage = '%prog [options] level_file')
+    parser.add_option('--preset', choices = sorted(PRESETS),
+                      help = 'start from one of: ' +
+                             ', '.join(sorted(PRESETS)))
+    parser.add_option('--count', type = 'int',
+                      help = 'number of enemies, overrides --density')
+    parser.add_option('--density', type = 'float',
+                      help = 'enemies per screen width')
+    parser.add_option('--length', type = 'int',
+                      help = 'pixels the spawns are spread over')
+    parser.add_option('--start', type = 'int',
+                      help = 'level pos of the first spawns')
+    parser.add_option('--mix', type = 'string', action = 'callback',
+                      callback = get_mix,
+                      help = 'enemy types and weights, '
+                             'e.g. enemy_01:3,enemy_05:1')
+    parser.add_option('--powerup-ratio', type = 'float',
+                      help = 'share of enemies carrying a power up')
+    parser.add_option('--seed', type = 'int',
+                      help = 'random seed, the same seed writes '
+                             'the same level')
+    options, args = parser.parse_args()
+    if len(args) != 1:
+        parser.error('give one level file to write')
+
+    settings = dict(PRESETS.get(options.preset, {}))
+    for name in ('count', 'density', 'length', 'start', 'mix',
+                 'powerup_ratio', 'seed'):
+        value = getattr(options, name, None)
+        if value is not None:
+            settings[name] = value
+
+    spawns = generate_level(**settings)
+    # end the level as long after the spawns as the hand made levels do
+    end = settings.get('start', LEVEL_START) + \
+          settings.get('length', LEVEL_LENGTH) + levels.END_MARGIN
+    write_level(args[0], spawns, end)
+    # read the file back, as the game will
+    level = open(args[0], 'r')
+    try:
+        table = levels.read_level(level, args[0])
+    finally:
+        level.close()
+    print '%s: %d spawns, %d types, level pos %d to %d, ends at %d' % \
+          (args[0], len(table), len(table.types),
+           min(table.x) if spawns else 0, max(table.x) if spawns else 0,
+           table.end)
+
+if __name__ == '__main__':
+    main()
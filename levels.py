@@ -0,0 +1,339 @@
+#-------------------------------------------------------------------------------
+# Name:        levels.py
+# Purpose:     Contains the SpawnTable class, a compact store for the
+#              enemy spawns of a level, read_level, which parses level
+#              files into one, functions compiling level files to a
+#              binary form cached next to them, and the LevelStream
+#              class, which reads a level's spawns as it plays.
+#
+# Author:      Will Taplin
+#
+# Created:     12/12/2011
+# Copyright:   (c) Owner 2011
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+import os
+import sys
+import struct
+from array import array
+from collections import deque
+
+# fields of a spawn record in a level file, each keyword is
+# followed by its value
+FIELDS = ('type', 'x', 'y', 'has_powerup')
+
+# a level without a level_end ends this far past its last spawn,
+# about what the hand made levels leave
+END_MARGIN = 1120
+
+# compiled levels are cached next to their level file, with
+# the same name and this extension
+CACHE_EXTENSION = '.lvc'
+CACHE_MAGIC = 'PSML'
+CACHE_VERSION = 2
+# magic, version, byte order of the records ('l' or 'b'), size and
+# mtime of the level file compiled, level end, bytes of type names,
+# record count
+CACHE_HEADER = struct.Struct('<4sHcxQdiII')
+# a record is type id, x, y and has_powerup as native ints
+RECORD_FIELDS = 4
+BYTE_ORDER = sys.byteorder[0]
+
+class LevelError(Exception):
+    """ A level file that can't be parsed. The message names
+    the file and line of the problem """
+    pass
+
+class SpawnTable():
+    """ Enemy spawn records for a level, one column per field
+    held in typed arrays. Enemy types are stored as ids into
+    self.types so a record costs a few bytes instead of a sprite """
+    def __init__(self):
+        self.types = [] # enemy type names, indexed by type id
+        self.type_ids = dict() # enemy type name : type id
+        self.type_id = array('B')
+        self.x = array('i')
+        self.y = array('i')
+        self.has_powerup = array('B')
+        self.end = None # level pos the level ends at
+
+    def __len__(self):
+        return len(self.x)
+
+    def get_type_id(self, enemy_type):
+        # return the id of enemy_type, adding it to the
+        # type list the first time it's seen
+        type_id = self.type_ids.get(enemy_type)
+        if type_id is None:
+            type_id = len(self.types)
+            self.types.append(enemy_type)
+            self.type_ids[enemy_type] = type_id
+        return type_id
+
+    def add(self, enemy_type, x, y, has_powerup):
+        # append a spawn record
+        self.type_id.append(self.get_type_id(enemy_type))
+        self.x.append(x)
+        self.y.append(y)
+        self.has_powerup.append(has_powerup)
+
+    def get(self, index):
+        # return the record at index as
+        # (enemy type, x, y, has_powerup)
+        return (self.types[self.type_id[index]], self.x[index],
+                self.y[index], bool(self.has_powerup[index]))
+
+    def sort(self):
+        # order the records by x, records at the same x
+        # keep their original order
+        order = sorted(xrange(len(self.x)), key = self.x.__getitem__)
+        for name in ('type_id', 'x', 'y', 'has_powerup'):
+            column = getattr(self, name)
+            setattr(self, name,
+                    array(column.typecode, [column[i] for i in order]))
+
+    def get_records(self):
+        # return the records as one array of ints, RECORD_FIELDS
+        # per record in the order type id, x, y, has_powerup
+        records = array('i', [0]) * (len(self) * RECORD_FIELDS)
+        for field, name in enumerate(('type_id', 'x', 'y', 'has_powerup')):
+            records[field::RECORD_FIELDS] = array('i', getattr(self, name))
+        return records
+
+    def set_records(self, types, records):
+        # replace the records with those in records, laid out as
+        # get_records returns them, with type ids indexing types
+        self.types = list(types)
+        self.type_ids = dict((enemy_type, type_id) for type_id, enemy_type
+                             in enumerate(self.types))
+        for field, name in enumerate(('type_id', 'x', 'y', 'has_powerup')):
+            column = getattr(self, name)
+            setattr(self, name,
+                    array(column.typecode, records[field::RECORD_FIELDS]))
+
+def iter_level(lines, filename = '<level>', in_order = False):
+    # parse lines, the lines of a level file, yielding ('spawn', (enemy
+    # type, x, y, has_powerup)) for each spawn record and ('level_end',
+    # pos) for a level_end. A record is begin_enemy, each of FIELDS
+    # followed by its value, then end_enemy, and may span lines. If
+    # in_order is True spawns must come in level pos order. Raises
+    # LevelError naming filename and the line of the first problem found
+    record = None # field : value of the record being read
+    keyword = None # field waiting for its value
+    start = 0 # line the record being read began on
+    ended = False # True after level_end
+    last_x = None
+
+    def error(line_number, message):
+        return LevelError('%s, line %d: %s' % (filename, line_number, message))
+
+    line_number = 0
+    for line in lines:
+        line_number += 1
+        for word in line.split():
+            if keyword is not None:
+                # word is the value of keyword
+                if keyword == 'type':
+                    record['type'] = word
+                elif keyword == 'has_powerup':
+                    if word not in ('True', 'False'):
+                        raise error(line_number, 'has_powerup must be '
+                                    'True or False, not %r' % word)
+                    record['has_powerup'] = word == 'True'
+                else:
+                    try:
+                        value = int(word)
+                    except ValueError:
+                        raise error(line_number, '%s must be a whole '
+                                    'number, not %r' % (keyword, word))
+                    if keyword == 'level_end':
+                        ended = True
+                        yield 'level_end', value
+                    else:
+                        record[keyword] = value
+                keyword = None
+            elif ended:
+                raise error(line_number, '%r after level_end' % word)
+            elif word == 'begin_enemy':
+                if record is not None:
+                    raise error(line_number, 'begin_enemy before the '
+                                'end_enemy of the record on line %d' % start)
+                record = dict()
+                start = line_number
+            elif word == 'level_end' and record is None:
+                keyword = word
+            elif record is None:
+                raise error(line_number, 'expected begin_enemy, not %r' % word)
+            elif word == 'end_enemy':
+                missing = [field for field in FIELDS if field not in record]
+                if missing:
+                    raise error(line_number, 'record missing %s' %
+                                ', '.join(missing))
+                x = record['x']
+                if in_order and last_x is not None and x < last_x:
+                    raise error(start, 'spawn at x %d after one at x %d, '
+                                'spawns must be in level pos order' %
+                                (x, last_x))
+                last_x = x
+                yield 'spawn', (record['type'], x, record['y'],
+                                record['has_powerup'])
+                record = None
+            elif word in FIELDS:
+                keyword = word
+            else:
+                raise error(line_number, 'unknown keyword %r' % word)
+
+    if keyword is not None:
+        raise error(line_number, '%s has no value' % keyword)
+    if record is not None:
+        raise error(start, 'record has no end_enemy')
+
+def read_level(lines, filename = '<level>', table = None):
+    # parse the spawn records in lines, the lines of a level file, into
+    # table, or a new SpawnTable, and return it. The table's end is the
+    # level_end, if the file has one, or END_MARGIN past the last spawn
+    if table is None:
+        table = SpawnTable()
+    add = table.add
+    for kind, value in iter_level(lines, filename):
+        if kind == 'spawn':
+            add(*value)
+        else:
+            table.end = value
+    if table.end is None:
+        table.end = max(table.x or [0]) + END_MARGIN
+    return table
+
+class LevelStream():
+    """ Reads the spawns of a level file while the level plays,
+    holding only those up to lookahead pixels past the spawn point,
+    so memory stays flat however long the level is. The file's
+    spawns must be in level pos order. self.end is None until the
+    reader reaches the level_end, or END_MARGIN past the last spawn
+    if the file has none """
+    def __init__(self, filename, lookahead = 640):
+        self.lookahead = lookahead
+        self.level = open(filename, 'r')
+        self.records = iter_level(self.level, os.path.basename(filename),
+                                  in_order = True)
+        self.pending = deque() # spawns read, in level pos order
+        self.end = None
+        self.last_x = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def read_ahead(self, pos):
+        # read spawns until one is past pos + lookahead or the file ends
+        limit = pos + self.lookahead
+        pending = self.pending
+        while self.records is not None and \
+              (not pending or pending[-1][1] <= limit):
+            try:
+                kind, value = self.records.next()
+            except StopIteration:
+                self.close()
+                break
+            if kind == 'spawn':
+                pending.append(value)
+                self.last_x = value[1]
+            else:
+                self.end = value
+
+    def get_spawns(self, pos):
+        # return the spawns at or before level pos pos not
+        # returned before, in order
+        self.read_ahead(pos)
+        pending = self.pending
+        spawns = []
+        while pending and pending[0][1] <= pos:
+            spawns.append(pending.popleft())
+        return spawns
+
+    def close(self):
+        if self.records is not None:
+            self.level.close()
+            self.records = None
+            if self.end is None:
+                self.end = self.last_x + END_MARGIN
+
+def get_cache_name(filename):
+    # return the name of the compiled cache of level file filename
+    return os.path.splitext(filename)[0] + CACHE_EXTENSION
+
+def write_compiled(table, filename, source_stat):
+    # write table to filename, compiled, marked with the size and
+    # mtime in source_stat, the os.stat of the level file it came from
+    types = '\n'.join(table.types)
+    header = CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, BYTE_ORDER,
+                               source_stat.st_size, source_stat.st_mtime,
+                               table.end, len(types), len(table))
+    compiled = open(filename, 'wb')
+    try:
+        compiled.write(header + types + table.get_records().tostring())
+    finally:
+        compiled.close()
+
+def read_compiled(filename, source_stat = None):
+    # return the SpawnTable compiled in filename. Returns None if
+    # filename isn't a compiled level of this version or, given
+    # source_stat, if the level file has changed since it was compiled
+    compiled = open(filename, 'rb')
+    try:
+        data = compiled.read()
+    finally:
+        compiled.close()
+    if len(data) < CACHE_HEADER.size:
+        return None
+    magic, version, byte_order, size, mtime, end, type_bytes, count = \
+        CACHE_HEADER.unpack_from(data)
+    if magic != CACHE_MAGIC or version != CACHE_VERSION:
+        return None
+    if source_stat is not None and (size != source_stat.st_size or
+                                    mtime != source_stat.st_mtime):
+        return None
+    start = CACHE_HEADER.size + type_bytes
+    records = array('i')
+    if len(data) != start + count * RECORD_FIELDS * records.itemsize:
+        return None
+    records.fromstring(data[start:])
+    if byte_order != BYTE_ORDER:
+        records.byteswap()
+    types = data[CACHE_HEADER.size:start]
+    table = SpawnTable()
+    table.set_records(types.split('\n') if types else [], records)
+    table.end = end
+    return table
+
+def compile_level(filename, cache = None):
+    # parse level file filename into a SpawnTable sorted by x and
+    # write it compiled to cache, get_cache_name(filename) if None.
+    # Returns the table. If the cache can't be written the table is
+    # still returned
+    if cache is None:
+        cache = get_cache_name(filename)
+    source_stat = os.stat(filename)
+    level = open(filename, 'r')
+    try:
+        table = read_level(level, os.path.basename(filename))
+    finally:
+        level.close()
+    table.sort()
+    try:
+        write_compiled(table, cache, source_stat)
+    except (IOError, OSError):
+        pass
+    return table
+
+def load_level(filename):
+    # return the SpawnTable of level file filename, sorted by x.
+    # It's read from the compiled cache if that is up to date,
+    # otherwise the level file is compiled again
+    cache = get_cache_name(filename)
+    if os.path.exists(cache):
+        table = read_compiled(cache, os.stat(filename))
+        if table is not None:
+            return table
+    return compile_level(filename, cache)
@@ -9,13 +9,85 @@
 # Licence:     <your licence>
 #-------------------------------------------------------------------------------
 #!/usr/bin/env python
+import sys
+import optparse
+import engine
 import game
 import states
 
+def get_options(args):
+    # read the command line. The audio options let you find the
+    # smallest mixer buffer that doesn't crackle on a machine
+    parser = optparse.OptionParser()
+    parser.add_option('--audio-rate', type = 'int', default = 44100,
+                      help = 'mixer sample rate in Hz')
+    parser.add_option('--audio-buffer', type = 'int', default = 2048,
+                      help = 'samples per mixer buffer, smaller buffers '
+                             'have less latency')
+    parser.add_option('--audio-channels', type = 'int', default = 2,
+                      help = 'output channels, 1 mono or 2 stereo')
+    parser.add_option('--audio-voices', type = 'int', default = 8,
+                      help = 'mixer channels for sound effects')
+    parser.add_option('--audio-latency', action = 'store_true',
+                      default = False,
+                      help = 'log the delay from a game step to its '
+                             'sounds reaching the mixer')
+    parser.add_option('--pixel-collisions', action = 'store_true',
+                      default = False,
+                      help = 'confirm hitbox hits against the sprites\' '
+                             'pixels')
+    parser.add_option('--stream-levels', action = 'store_true',
+                      default = False,
+                      help = 'read level files while they play instead '
+                             'of loading them first')
+    parser.add_option('--rewind', action = 'store_true', default = False,
+                      help = 'keep the last ten seconds of play, hold '
+                             'SELECT to rewind')
+    parser.add_option('--record', metavar = 'FILE',
+                      help = 'start straight in a level and record the '
+                             'input to FILE')
+    parser.add_option('--level', type = 'int', default = 1,
+                      help = 'level to start in when recording')
+    parser.add_option('--replay', metavar = 'FILE',
+                      help = 'play back the input recorded in FILE')
+    options, args = parser.parse_args(args)
+    if options.rewind and options.stream_levels:
+        parser.error('streamed levels can\'t be rewound')
+    return options
+
+def get_mixer_settings(options):
+    # build the mixer settings from the command line options
+    return engine.sound.MixerSettings(options.audio_rate, -16,
+                                      options.audio_channels,
+                                      options.audio_buffer,
+                                      options.audio_voices,
+                                      options.audio_latency)
+
 def main():
-    new_game = game.PsmGame()
-    new_game.run()
+    options = get_options(sys.argv[1:])
+    new_game = game.PsmGame(get_mixer_settings(options))
+    new_game.pixel_collisions = options.pixel_collisions
+    new_game.stream_levels = options.stream_levels
+    if options.rewind:
+        new_game.enable_rewind()
+    if options.replay:
+        try:
+            new_game.play_replay(engine.replay.Replay(options.replay))
+        except IOError, message:
+            print 'Cannot load replay:', message
+            raise SystemExit, message
+        except engine.snapshot.SnapshotError, message:
+            print 'Cannot play replay, it was recorded with rewind on:', \
+                  message
+            raise SystemExit, message
+    elif options.record:
+        new_game.record(options.level)
+    try:
+        new_game.run()
+    finally:
+        # save the recording however the game ends
+        if new_game.recorder is not None:
+            new_game.recorder.save(options.record)
 
 if __name__ == '__main__':
     main()
-
@@ -23,6 +23,7 @@ class Player(engine.objects.AnimatedSprite):
         spaceship. Note: intermediate values for x,y coords
         are used(dx,dy) to assign floating point values to
         rect attributes """
+    collision_layer = 'player'
 
     def __init__(self, game, x, y, images):
         engine.objects.AnimatedSprite.__init__(self,x,y,images, 20)
@@ -114,7 +115,7 @@ class Player(engine.objects.AnimatedSprite):
                 self.last_update = current_time
 
             # turn off protection after self.protect_duration m/s.
-            if pygame.time.get_ticks() - self.explode_time > self.protect_duration:
+            if engine.system.get_ticks() - self.explode_time > self.protect_duration:
                 self.protected = False
 
         # update the rect and hitbox
@@ -151,7 +152,7 @@ class Player(engine.objects.AnimatedSprite):
                         self.current_weapon_index = 0
                     if len(self.weapons) > 1:
                         self.change_weapon_sound.play()
-                    self.changed_weapon_time = pygame.time.get_ticks()
+                    self.changed_weapon_time = engine.system.get_ticks()
 
             # shoot on 'B' button press
             if game.input_manager.is_held('B'):
@@ -192,8 +193,8 @@ class Player(engine.objects.AnimatedSprite):
 
     def explode(self):
         # create explosion sprite
-        ex = bullets.Explosion(self.rect.x, self.rect.y, 
-                               self.game.image_manager.get_image('explosion'))
+        ex = bullets.Explosion.create(self.rect.x, self.rect.y, 
+                                      self.game.image_manager.get_image('explosion'))
 
         # play sound
         self.explosion_sound.play()
@@ -209,7 +210,7 @@ class Player(engine.objects.AnimatedSprite):
         self.current_weapon_index = 0
 
         # save time of death and set timer for protection
-        self.explode_time = pygame.time.get_ticks()
+        self.explode_time = engine.system.get_ticks()
         self.protect_duration = 3000
 
         # If lives remain, disable player input, hide the
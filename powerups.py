@@ -4,26 +4,34 @@
 #-----------------------------------------------------------------------------
 
 import pygame
+import engine
 from engine.system import TIMESTEP
 from engine.system import SCREEN_RECT
 
-class PowerUp(pygame.sprite.Sprite):
+class PowerUp(engine.objects.PooledSprite, pygame.sprite.Sprite):
     """ PowerUp Class - A power up sprite that can be collected by 
         the player.  Power up types: 0 -  Spreader Gun, 1 - Reverse Fire Gun,
         2 - Laser Beam, 3 - Move Speed, 4 - Fire Speed """
+    collision_layer = 'powerups'
+    wake_time = -1 # always updated
     def __init__(self, game, x, y, type):
         pygame.sprite.Sprite.__init__(self)
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.hitbox = pygame.Rect(0, 0, 14, 12)
+        self.reset(game, x, y, type)
+
+    def reset(self, game, x, y, type):
+        # (re)initialize the power up at x, y
         self.type = type 
         self.image = game.image_manager.get_image('powerups')[type]
         self.sound = game.sound_manager.get_sound('powerup')
-        self.rect = self.image.get_rect()
+        self.rect.size = self.image.get_size()
         self.rect.x = x
         self.rect.y = y
         self.dx = self.rect.x
         self.dy = self.rect.y
         self.speed = 50
         self.bounds = SCREEN_RECT
-        self.hitbox = pygame.Rect(self.dx, self.dy, 14, 12)
         self.hb_offsetx = 1
         self.hb_offsety = 2
         self.hitbox.x = self.rect.x + self.hb_offsetx
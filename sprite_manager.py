@@ -15,7 +15,19 @@ import os
 import pygame
 from pygame.locals import *
 import engine
-import enemies
+import levels
+import bullets
+import powerups
+
+# bullets a group must hold before its new bullets go into the bullet
+# engine, with fewer they are quicker as sprites. Bullets already in
+# the engine stay there until they die. See python benchmarks.py bullets
+BULLET_ENGINE_MIN = 30
+
+# batchable enemies there must be before the motion batch takes them
+# over, with fewer their own updates are quicker. It hands them back
+# once fewer than half that are left. See python benchmarks.py enemies
+MOTION_BATCH_MIN = 50
 
 class SpriteManager(engine.objects.SpriteManager):
     """ Container for all game sprite groups and their sprites.
@@ -24,138 +36,457 @@ class SpriteManager(engine.objects.SpriteManager):
     def __init__(self, game):
         engine.objects.SpriteManager.__init__(self)
         # Create all sprite groups and add them to
-        # self.objects
+        # self.objects. The groups keep their sprites in the order
+        # they were added, so updates and collisions run in the same
+        # order every time and a replay plays out the same
         self.game = game
-        player_group = pygame.sprite.Group()
-        enemy_group = pygame.sprite.Group()
-        player_shots = pygame.sprite.Group()
-        enemy_shots = pygame.sprite.Group()
-        powerups_group = pygame.sprite.Group()
-        explosion_group = pygame.sprite.Group()
+        player_group = pygame.sprite.OrderedUpdates()
+        enemy_group = pygame.sprite.OrderedUpdates()
+        player_shots = pygame.sprite.OrderedUpdates()
+        enemy_shots = pygame.sprite.OrderedUpdates()
+        powerups_group = pygame.sprite.OrderedUpdates()
+        explosion_group = pygame.sprite.OrderedUpdates()
         self.add_group(enemy_group, 'enemy_group')
         self.add_group(player_shots, 'player_shots')
         self.add_group(enemy_shots, 'enemy_shots')
         self.add_group(explosion_group, 'explosions')
         self.add_group(powerups_group, 'powerups')
         self.add_group(player_group, 'player_group')
-        self.enemy_queue = [] # list of offscreen enemies
+        self.enemy_queue = levels.SpawnTable() # spawns, sorted by level pos
+        self.spawn_cursor = 0 # index of the next enemy to spawn
+        self.level_stream = None # levels.LevelStream when streaming
+        self.enemy_factory = game.enemy_factory
+        self.boss = None # boss waiting to be spawned
+        # when numpy is available, crowded groups keep their bullets in
+        # numpy arrays and enemies with simple paths are moved together
+        if engine.projectiles.numpy is not None:
+            self.bullet_engine = engine.projectiles.BulletEngine(
+                ['player_shots', 'enemy_shots', 'explosions'])
+            self.motion_batch = engine.motion.MotionBatch()
+        else:
+            self.bullet_engine = None
+            self.motion_batch = None
+        self.bullet_engine_min = BULLET_ENGINE_MIN
+        self.motion_batch_min = MOTION_BATCH_MIN
+        self.batchable = [] # batchable enemies moving themselves
+        # broadphase for the player shots that are sprites
+        self.shot_grid = engine.collision.SpatialHash(engine.system.SCREEN_RECT)
+
+        # Collision layers. Sprites are put on the layer named by their
+        # collision_layer as they are added, sprites with none (like
+        # explosions) are never tested. A layer's bullets live in the
+        # bullet engine under its owner
+        self.layers = dict() # layer : group of its sprites
+        self.layer_owners = dict() # layer : bullet engine owner
+        self.add_layer('player')
+        self.add_layer('enemies')
+        self.add_layer('player_shots', 'player_shots')
+        self.add_layer('enemy_shots', 'enemy_shots')
+        self.add_layer('shrapnel', 'explosions')
+        self.add_layer('powerups')
+
+        # Collision matrix, the pairs of layers tested against each other
+        # and their handlers. Each sprite on a layer runs through all of
+        # its layer's pairs in turn, layers in the order listed here
+        self.collision_pairs = []
+        self.add_collision_pair('enemies', 'player', self.enemy_hits_player)
+        self.add_collision_pair('enemies', 'player_shots',
+                                self.shot_hits_enemy, self.prepare_shot_hits)
+        self.add_collision_pair('player', 'shrapnel',
+                                self.shrapnel_hits_player)
+        self.add_collision_pair('player', 'enemy_shots',
+                                self.enemy_shot_hits_player)
+        self.add_collision_pair('player', 'powerups', self.collect_powerup)
         self.update_order = ['player_group',  'enemy_group', 'player_shots',
                              'enemy_shots', 'powerups', 'explosions']
         self.draw_order = ['player_shots','player_group', 'enemy_group', 
                            'powerups', 'explosions','enemy_shots']
 
+        # counts for the last frame, see get_stats
+        self.stats = {'updated': 0, 'batched': 0, 'sleeping': 0,
+                      'drawn': 0, 'culled': 0}
+
     def update(self, current_time, viewport, player_rect):
         # update all sprites in the game
         # step through self.objects and call
         # each groups update method
 
+        # sprites in the motion batch are moved by it, not their update.
+        # Sprites with nothing to do until their wake_time sleep
+        if self.motion_batch is not None:
+            self.balance_batch()
+            batched = self.motion_batch.members
+        else:
+            batched = ()
+        updated = 0
+        sleeping = 0
+
         for key in self.update_order:
             for sprite in self.sprites[key]:
+                if sprite in batched:
+                    continue
+                if current_time <= sprite.wake_time:
+                    sleeping += 1
+                    continue
+                updated += 1
                 enemy_bullet = sprite.update(current_time, player_rect, self.game)
                 if enemy_bullet is not None:
                     self.add_sprite(enemy_bullet, 'enemy_shots')
+            if key == 'enemy_group' and self.motion_batch is not None:
+                for enemy_bullet in self.motion_batch.update(current_time,
+                                                             player_rect):
+                    self.add_sprite(enemy_bullet, 'enemy_shots')
+        self.stats['updated'] = updated
+        self.stats['sleeping'] = sleeping
+        self.stats['batched'] = len(batched)
+        if self.bullet_engine is not None:
+            self.bullet_engine.update(bullets.get_level_bounds(self.game))
 
         # spawn enemies
-        # check each enenmy's dx against level_pos
-        # Get index of enemy to spawn, pop it from the
-        # queue, call enemy's spawn method, and add it
-        # to the enemy group for update and draw
-        for enemy in self.enemy_queue:
-            if isinstance(enemy, enemies.Boss):
-                self.enemy_queue.remove(enemy)
-                enemy.spawn(current_time)
-                self.add_sprite(enemy, 'enemy_group')
-
-            elif viewport.level_pos + viewport.width >= enemy.dx:
-                 index = self.enemy_queue.index(enemy)
-                 spawn_enemy = self.enemy_queue.pop(index)
-                 spawn_enemy.spawn(current_time)
-                 self.add_sprite(spawn_enemy, 'enemy_group')
+        # the queue is sorted by level pos, so only the records
+        # from the cursor on need checking. Enemies are only created
+        # once the viewport reaches them, then spawned as one batch
+        spawn_pos = viewport.level_pos + viewport.width
+        queue = self.enemy_queue
+        batch = []
+        while self.spawn_cursor < len(queue) and \
+              queue.x[self.spawn_cursor] <= spawn_pos:
+            enemy_type, x, y, has_powerup = queue.get(self.spawn_cursor)
+            batch.append(self.create_enemy(self.game, enemy_type,
+                                           x, y, has_powerup))
+            self.spawn_cursor += 1
+        if self.level_stream is not None:
+            for enemy_type, x, y, has_powerup in self.read_stream(spawn_pos):
+                batch.append(self.create_enemy(self.game, enemy_type,
+                                               x, y, has_powerup))
+        if batch:
+            self.spawn_batch(batch, current_time)
 
-    def check_collisions(self, player):
-        # check for each type of collsion, update appropriately
+        # the boss spawns as soon as it is created
+        if self.boss is not None:
+            self.spawn_batch([self.boss], current_time)
+            self.boss = None
+
+    def balance_batch(self):
+        # give the batchable enemies to the motion batch once there are
+        # more than motion_batch_min of them, and take them back when
+        # the batch is down to half that
+        batch = self.motion_batch
+        if len(batch):
+            batch.remove_dead()
+            if len(batch) <= self.motion_batch_min // 2:
+                self.batchable = batch.release()
+        else:
+            self.batchable = [enemy for enemy in self.batchable
+                              if enemy.alive()]
+            if len(self.batchable) > self.motion_batch_min:
+                for enemy in self.batchable:
+                    batch.add(enemy)
+                self.batchable = []
+
+    def draw(self, surface):
+        # draw each group, followed by its bullets in the bullet engine.
+        # Only sprites and bullets overlapping the game world are drawn,
+        # the rest are offscreen or under the HUD
+        area = self.game.game_world
+        drawn = 0
+        culled = 0
+        for key in self.draw_order:
+            visible = [sprite for sprite in self.sprites[key]
+                       if area.colliderect(sprite.rect)]
+            engine.graphics.blit_all(surface, [(sprite.image, sprite.rect)
+                                               for sprite in visible])
+            drawn += len(visible)
+            culled += len(self.sprites[key]) - len(visible)
+            if self.bullet_engine is not None:
+                bullets_drawn, bullets_culled = \
+                    self.bullet_engine.draw(surface, key, area)
+                drawn += bullets_drawn
+                culled += bullets_culled
+        self.stats['drawn'] = drawn
+        self.stats['culled'] = culled
+
+    def get_stats(self):
+        # returns the counts for the last frame: sprites updated, moved
+        # by the motion batch and sleeping, and sprites and bullets drawn
+        # and culled
+        return dict(self.stats)
 
+    def add_sprite(self, sprite, group):
+        # add a sprite or list of sprites to group and to the collision
+        # layer it collides on. Bullets added to a group holding
+        # bullet_engine_min or more are copied into the bullet engine
+        # instead and their sprite recycled
+        if isinstance(sprite, list):
+            for item in sprite:
+                self.add_sprite(item, group)
+        elif self.bullet_engine is not None and \
+             isinstance(sprite, bullets.Bullet) and \
+             self.get_count(group) >= self.bullet_engine_min:
+            self.bullet_engine.add_sprite(group, sprite)
+            sprite.get_pool().release(sprite)
+        else:
+            engine.objects.SpriteManager.add_sprite(self, sprite, group)
+            if sprite.collision_layer is not None:
+                self.layers[sprite.collision_layer].add(sprite)
+
+    def add_layer(self, layer, owner = None):
+        # add a collision layer, owner is the bullet engine
+        # owner of the layer's bullets
+        self.layers[layer] = pygame.sprite.OrderedUpdates()
+        self.layer_owners[layer] = owner
+
+    def add_collision_pair(self, layer, other_layer, handler, prepare = None):
+        # test the sprites on layer against those on other_layer.
+        # handler(player, sprite, others) is called for each sprite on
+        # layer with the list of sprites on other_layer, and returns True
+        # if the player died. prepare(sprites, others), if given, is
+        # called first with both lists
+        for first_layer, pairs in self.collision_pairs:
+            if first_layer == layer:
+                break
+        else:
+            pairs = []
+            self.collision_pairs.append((layer, pairs))
+        pairs.append((other_layer, handler, prepare))
+
+    def get_layer_count(self, layer):
+        # number of sprites and bullets on layer
+        count = len(self.layers[layer])
+        owner = self.layer_owners[layer]
+        if owner is not None and self.bullet_engine is not None:
+            count += self.bullet_engine.get_count(owner)
+        return count
+
+    def empty_group(self, group):
+        # remove all sprites and bullets in group
+        for sprite in self.sprites[group]:
+            if sprite.collision_layer is not None:
+                self.layers[sprite.collision_layer].remove(sprite)
+        self.sprites[group].empty()
+        if self.bullet_engine is not None:
+            self.bullet_engine.clear(group)
+
+    def get_count(self, group):
+        # number of sprites and bullets in group
+        count = len(self.sprites[group])
+        if self.bullet_engine is not None:
+            count += self.bullet_engine.get_count(group)
+        return count
+
+    def spawn_batch(self, batch, current_time):
+        # move a group of enemies onscreen and add them to
+        # the enemy group together
+        for enemy in batch:
+            enemy.spawn(current_time)
+            if self.motion_batch is not None and enemy.batched:
+                if len(self.motion_batch):
+                    self.motion_batch.add(enemy)
+                else:
+                    self.batchable.append(enemy)
+        self.sprites['enemy_group'].add(batch)
+        self.layers['enemies'].add(batch)
+
+    def check_collisions(self, player):
+        # run the collision matrix, returns True if the player died.
+        # A layer's sprites are listed when the first pair using the
+        # layer runs, pairs with an empty layer are skipped
         player_die = False
+        members = dict() # layer : list of its sprites
+        for layer, pairs in self.collision_pairs:
+            if layer not in members:
+                members[layer] = self.layers[layer].sprites()
+            active = []
+            for other_layer, handler, prepare in pairs:
+                if other_layer not in members:
+                    members[other_layer] = self.layers[other_layer].sprites()
+                if self.get_layer_count(layer) and \
+                   self.get_layer_count(other_layer):
+                    if prepare is not None:
+                        prepare(members[layer], members[other_layer])
+                    active.append((handler, members[other_layer]))
+            if not active:
+                continue
+            for sprite in members[layer]:
+                for handler, others in active:
+                    if handler(player, sprite, others):
+                        player_die = True
+        return player_die
 
-        # Check for player collision and player shot collision
-        # with all enemies onscreen
-        for enemy in self.sprites['enemy_group']:
-            # check player collision with enemy
+    def enemy_hits_player(self, player, enemy, players):
+        # kill the enemy and player on contact, create explosions
+        # at their positions. The boss does not die on collision
+        player_die = False
+        for target in players:
             for box in enemy.hitbox:
-                if player.hitbox.colliderect(box) and \
-                not player.protected:
-                    # kill the enemy and player, create explosions
-                    # at their positions.
-                    self.sprites['player_shots'].empty()
-                    player_ex = player.explode()
-                    if not self.game.boss_level: # boss does not die on collision
+                if target.hitbox.colliderect(box) and \
+                not target.protected and self.pixel_hit(target.image,
+                                                        target.rect.topleft,
+                                                        enemy):
+                    self.empty_group('player_shots')
+                    player_ex = target.explode()
+                    if not self.game.boss_level:
                         enemy.kill()
                         enemy_ex, powerup = enemy.explode()
                         self.add_sprite(enemy_ex, 'explosions')
                     self.add_sprite(player_ex, 'explosions')
                     player_die = True
-            for bullet in self.sprites['player_shots']:
-                # check player shot collision with 
-                for box in enemy.hitbox:
-                    if bullet.hitbox.colliderect(box):
-                        # decrement enemy.hits if multi-hit enemy
-                        if enemy.hits > 0:
-                            # double damage if bullet is beam
-                            if bullet.destroyable:
-                                damage = 1
-                            else:
-                                damage = 2
-                            # kill player shot to avoid one bullet registering 
-                            # multiple hits
-                            bullet.kill()
-                            # Hack ass way to check if boss hurtbox
-                            if self.game.boss_level:
-                                if box.width != 7:  # boss hurtbos has width 7
-                                    enemy.hit(0)  # no hit
-                                else:
-                                    enemy.hit(damage)
-                            else:
-                                enemy.hit(damage)
-                        else: # enemy destroyed
-                            # let the laser beam pass through enemies
-                            if bullet.destroyable:
-                                bullet.kill()
-                            # kill the enemy, get an explosion sprite, and 
-                            # a powerup on change
-                            ex, powerup = enemy.explode()
-                            # add the explosion sprite
-                            for sprite in ex:
-                                self.add_sprite(sprite,'explosions')
-                            # add the powerup if you get one
-                            if powerup is not None:
-                                self.add_sprite(powerup, 'powerups')
-                            player.score += enemy.points
+        return player_die
+
+    def prepare_shot_hits(self, enemy_list, shot_list):
+        # Bullets in the bullet engine are tested against all enemy
+        # hitboxes in one batch, enemies read their hits from it in turn.
+        # Player shots that are sprites go in a grid, so each enemy
+        # only tests the shots in the cells its hitboxes cover
+        self.shot_hits = None
+        if self.bullet_engine is not None and \
+           self.bullet_engine.get_count('player_shots'):
+            boxes = []
+            self.first_boxes = dict() # enemy : its first box in the batch
+            for enemy in enemy_list:
+                self.first_boxes[enemy] = len(boxes)
+                boxes.extend(enemy.hitbox)
+            self.shot_hits = self.bullet_engine.collide_boxes('player_shots',
+                                                              boxes)
+        if self.shot_grid is not None:
+            self.shot_grid.clear()
+            for bullet in shot_list:
+                self.shot_grid.insert(bullet.hitbox)
+
+    def shot_hits_enemy(self, player, enemy, shot_list):
+        # test the player shots against each of enemy's hitboxes,
+        # shot by shot
+        if self.shot_grid is not None:
+            nearby = [shot_list[index] for index in
+                      self.shot_grid.query(enemy.hitbox)]
+        else:
+            nearby = shot_list
+        # shots killed by earlier enemies are still in the grid
+        nearby = [bullet for bullet in nearby if bullet.alive()]
+        for index, box_num in engine.collision.collide_pairs(nearby,
+                                                             enemy.hitbox):
+            bullet = nearby[index]
+            box = enemy.hitbox[box_num]
+            if not self.pixel_hit(bullet.image, bullet.rect.topleft, enemy):
+                continue
+            if self.shot_hit(player, enemy, box, bullet.destroyable):
+                bullet.kill()
+
+        shot_engine = self.bullet_engine
+        if self.shot_hits is not None:
+            first_box = self.first_boxes[enemy]
+            last_box = first_box + len(enemy.hitbox)
+            for index, box_num in shot_engine.get_box_hits(self.shot_hits,
+                                                           first_box,
+                                                           last_box):
+                if not self.pixel_hit(shot_engine.get_image(index),
+                                      shot_engine.get_pos(index), enemy):
+                    continue
+                shot_engine.kill(index)
+                self.shot_hit(player, enemy, enemy.hitbox[box_num], True)
+        return False
 
+    def shrapnel_hits_player(self, player, target, shrapnel_list):
         # check for shrapnel explosion collision with player
-        for shrapnel in self.sprites['explosions']:
-            if shrapnel.hitbox is not None:
-                if shrapnel.hitbox.colliderect(player.hitbox) and \
-                not player.respawning and not player.protected:
-                    player_ex = player.explode()
+        player_die = False
+        for index in engine.collision.collide_hitboxes(target.hitbox,
+                                                       shrapnel_list):
+            shrapnel = shrapnel_list[index]
+            if not target.respawning and not target.protected and \
+            self.pixel_hit(shrapnel.image, shrapnel.rect.topleft, target):
+                player_ex = target.explode()
+                self.add_sprite(player_ex, 'explosions')
+                player_die = True
+        shot_engine = self.bullet_engine
+        if shot_engine is not None:
+            owner = self.layer_owners['shrapnel']
+            for index in shot_engine.collide_rect(owner, target.hitbox):
+                if not target.respawning and not target.protected and \
+                self.pixel_hit(shot_engine.get_image(index),
+                               shot_engine.get_pos(index), target):
+                    player_ex = target.explode()
                     self.add_sprite(player_ex, 'explosions')
                     player_die = True
+        return player_die
 
+    def enemy_shot_hits_player(self, player, target, enemy_shots):
         # check enemy bullet collision with player
-        for bullet in self.sprites['enemy_shots']:
-            if bullet.hitbox.colliderect(player.hitbox) and \
-            not player.protected:
+        player_die = False
+        for index in engine.collision.collide_hitboxes(target.hitbox,
+                                                       enemy_shots):
+            bullet = enemy_shots[index]
+            if not target.protected and \
+            self.pixel_hit(bullet.image, bullet.rect.topleft, target):
                 bullet.kill()
-                player_ex = player.explode()
+                player_ex = target.explode()
                 self.add_sprite(player_ex, 'explosions')
                 player_die = True
+        shot_engine = self.bullet_engine
+        if shot_engine is not None:
+            owner = self.layer_owners['enemy_shots']
+            for index in shot_engine.collide_rect(owner, target.hitbox):
+                if not target.protected and \
+                self.pixel_hit(shot_engine.get_image(index),
+                               shot_engine.get_pos(index), target):
+                    shot_engine.kill(index)
+                    player_ex = target.explode()
+                    self.add_sprite(player_ex, 'explosions')
+                    player_die = True
+        return player_die
 
-        for powerup in self.sprites['powerups']:
-            if player.hitbox.colliderect(powerup.hitbox):
+    def collect_powerup(self, player, target, powerup_list):
+        for powerup in powerup_list:
+            if target.hitbox.colliderect(powerup.hitbox):
                 type = powerup.collect()
-                player.power_up(type)
+                target.power_up(type)
+        return False
 
-        # return True if player has died
-        return player_die
+    def pixel_hit(self, image, pos, sprite):
+        # with pixel collisions on, confirm a hitbox hit by testing
+        # the cached mask of image drawn at pos against the mask of
+        # sprite's current image. The stretching laser beam has no
+        # cached mask, so its hits are left to the hitbox test
+        if not self.game.pixel_collisions:
+            return True
+        get_mask = self.game.image_manager.get_mask
+        return engine.collision.masks_overlap(get_mask(image), pos,
+                                              get_mask(sprite.image),
+                                              sprite.rect.topleft)
+
+    def shot_hit(self, player, enemy, box, destroyable):
+        # a player shot hit box of enemy, damage or destroy the enemy.
+        # Returns True if the shot should be killed
+        # decrement enemy.hits if multi-hit enemy
+        if enemy.hits > 0:
+            # double damage if bullet is beam
+            if destroyable:
+                damage = 1
+            else:
+                damage = 2
+            # Hack ass way to check if boss hurtbox
+            if self.game.boss_level:
+                if box.width != 7:  # boss hurtbos has width 7
+                    enemy.hit(0)  # no hit
+                else:
+                    enemy.hit(damage)
+            else:
+                enemy.hit(damage)
+            # kill player shot to avoid one bullet registering 
+            # multiple hits
+            return True
+        else: # enemy destroyed
+            # kill the enemy, get an explosion sprite, and 
+            # a powerup on change
+            ex, powerup = enemy.explode()
+            # add the explosion sprite
+            for sprite in ex:
+                self.add_sprite(sprite,'explosions')
+            # add the powerup if you get one
+            if powerup is not None:
+                self.add_sprite(powerup, 'powerups')
+            player.score += enemy.points
+            # let the laser beam pass through enemies
+            return destroyable
     
     def boss_destoyed(self):
         # Returns true if boss is completely destroyed
@@ -164,7 +495,7 @@ class SpriteManager(engine.objects.SpriteManager):
         if self.game.boss_level:
             if len(self.sprites['enemy_group']) == 0:
                 self.game.sound_manager.music_control("stop")
-                if len(self.sprites['explosions']) == 0:
+                if self.get_count('explosions') == 0:
                     destroyed = True
         return destroyed
 
@@ -172,99 +503,67 @@ class SpriteManager(engine.objects.SpriteManager):
     def load_level(self, game, filename):
         # Load a level consisting of enemy types and x,y
         # coords.
-        enemy_data = [] # list of strings parsed in
 
-        # create platform independent path, open
-        # file if available.
+        # create platform independent path, load the level's spawns
+        # sorted by level pos, from its compiled cache if up to date.
+        # When streaming, spawns are read as the level plays instead
         fullname = os.path.join('res', 'levels', filename)
         try:
-            level = open(fullname, "r")
-        except IOError:
+            if game.stream_levels:
+                self.level_stream = levels.LevelStream(fullname)
+            else:
+                self.enemy_queue = levels.load_level(fullname)
+        except (IOError, OSError):
             print 'Cannot load level:', filename
             raise SystemExit
+        except levels.LevelError, message:
+            print 'Cannot load level:', message
+            raise SystemExit, message
+        self.spawn_cursor = 0
 
-        # Read each line in the file
-        for line in level:
-            for word in line.split():
-                enemy_data.append(word)
-
-            # Read each data element and store their
-            # associated values in temp variables.
-            # At end_enemy, pass temp variables to create enemy
-            for element in enemy_data:
-                next_index = enemy_data.index(element) + 1
-                if element == 'type':
-                    # Data to read is at next index
-                    enemy_type = enemy_data[next_index]
-                elif element == 'x':
-                    x = int(enemy_data[next_index])
-                elif element == 'y':
-                    y = int(enemy_data[next_index])
-                elif element == 'has_powerup':
-                    if enemy_data[next_index] == 'True':
-                        has_powerup = True 
-                    else:
-                        has_powerup = False
-                elif element == 'end_enemy':
-                    self.create_enemy(game, enemy_type, x, y, has_powerup)
-                    enemy_data = []  # reset the list
-
-        # close the level file
-        level.close()
+        # look up images and sounds for the level's enemy types now
+        # rather than on their first spawn
+        self.enemy_factory.prepare(self.enemy_queue.types)
+        self.prewarm_pools(game)
 
-    def create_enemy(self, game, enemy_type, x, y, has_powerup):
-        # Creates an enemy of enemy_type at x, y
-
-        # flip images if left to right enemy       
-        flipped_enemies = ['enemy_08', 'enemy_09', 'enemy_10']
-        if enemy_type in flipped_enemies:
-            if enemy_type == 'enemy_08':
-                images = list(game.image_manager.get_image('enemy_01'))
-            elif enemy_type == 'enemy_09':
-                images = list(game.image_manager.get_image('enemy_03'))
-            elif enemy_type == 'enemy_10':
-                images = list(game.image_manager.get_image('enemy_06'))
-            for i in xrange(0, len(images)):
-                images[i] = pygame.transform.flip(images[i], True, False)
-        else: # right to left enemy, use normal images
-             images = game.image_manager.get_image(enemy_type)
-            
-
-        # create appropriate enemy depending on enemy_type
-        if enemy_type == 'enemy_01':
-            enemy = enemies.Enemy1(game, x, y, has_powerup, images)
-        elif enemy_type == 'enemy_02':
-            enemy = enemies.Enemy2(game, x, y, has_powerup, images)
-        elif enemy_type == 'enemy_03':
-            enemy = enemies.Enemy3(game, x, y, has_powerup, images)
-        elif enemy_type == 'enemy_04':
-            enemy = enemies.Enemy4(game, x, y, has_powerup, images)
-        elif enemy_type == 'enemy_05':
-            enemy = enemies.Enemy5(game, x, y, has_powerup, images)
-        elif enemy_type == 'enemy_06':
-            enemy = enemies.Enemy6(game, x, y, has_powerup, images)
-        elif enemy_type == 'enemy_07':
-            enemy = enemies.Enemy7(game, x, y, has_powerup, images)
-        elif enemy_type == 'enemy_08':
-            enemy = enemies.Enemy8(game, x, y, has_powerup, images)
-        elif enemy_type == 'enemy_09':
-            enemy = enemies.Enemy9(game, x, y, has_powerup, images)
-        elif enemy_type == 'enemy_10':
-            enemy = enemies.Enemy10(game, x, y, has_powerup, images)
-        elif enemy_type == 'enemy_11':
-            enemy = enemies.Enemy11(game, x, y, has_powerup, images)
-        elif enemy_type == 'enemy_12':
-            enemy = enemies.Enemy12(game, x, y, has_powerup, images)
-        elif enemy_type == 'enemy_13':
-            enemy = enemies.Enemy13(game, x, y, has_powerup, images)
-        elif enemy_type == 'enemy_14':
-            enemy = enemies.Enemy14(game, x, y, has_powerup, images)
-        elif enemy_type == 'enemy_15':
-            enemy = enemies.Enemy15(game, x, y, has_powerup, images)
-        elif enemy_type == 'boss':
-            enemy = enemies.Boss(game, x, y, has_powerup, images)
-
-        # Add enemy to enemy queue
-        self.enemy_queue.append(enemy)
+    def read_stream(self, spawn_pos):
+        # return the streamed spawns the viewport has reached
+        try:
+            return self.level_stream.get_spawns(spawn_pos)
+        except levels.LevelError, message:
+            print 'Cannot load level:', message
+            raise SystemExit, message
+
+    def get_level_end(self):
+        # return the level pos the level ends at, None
+        # while a streamed level hasn't read that far
+        if self.level_stream is not None:
+            return self.level_stream.end
+        return self.enemy_queue.end
 
+    def prewarm_pools(self, game):
+        # fill the sprite pools up to the most shots, explosions and
+        # power ups usually alive at once, so the level doesn't start
+        # out allocating them
+        get_image = game.image_manager.get_image
+        bullets.BasicBullet.get_pool().prewarm(4, 0, 0, 0, get_image('pshot'))
+        bullets.SpreaderBullet.get_pool().prewarm(9, 0, 0, 0,
+                                                  get_image('spreadshot'))
+        bullets.ReverseFireBullet.get_pool().prewarm(9, 0, 0, 140,
+                                                     get_image('pshot'))
+        bullets.EnemyBullet.get_pool().prewarm(12, 0, 0, 0, get_image('eshot'))
+        bullets.EnemyBulletAngle.get_pool().prewarm(12, 0, 0, 0, 75,
+                                                    get_image('eshot'))
+        bullets.Shrapnel.get_pool().prewarm(16, 0, 0, 0,
+                                            get_image('shrapnel'))
+        bullets.Explosion.get_pool().prewarm(6, 0, 0,
+                                             get_image('explosion'))
+        powerups.PowerUp.get_pool().prewarm(2, game, 0, 0, 0)
 
+    def queue_boss(self, game, x, y):
+        # create the boss, it spawns on the next update
+        self.boss = self.create_enemy(game, 'boss', x, y, False)
+
+    def create_enemy(self, game, enemy_type, x, y, has_powerup):
+        # Creates and returns an enemy of enemy_type at x, y
+        return self.enemy_factory.create(enemy_type, x, y, has_powerup)
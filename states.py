@@ -11,7 +11,6 @@
 #----------------------------------------------------------------------------
 #!/usr/bin/env python
 
-import pygame
 from pygame.locals import *
 import engine
 import player
@@ -20,6 +19,11 @@ import sprite_manager
 
 from engine.system import SCREEN_RECT
 
+# with rewind on, the level is snapshot every REWIND_INTERVAL m/s
+# and the last REWIND_SNAPSHOTS kept, ten seconds of play
+REWIND_INTERVAL = 100
+REWIND_SNAPSHOTS = 100
+
 class TitleScreenState(engine.system.State):
     def __init__(self, game):
         engine.system.State.__init__(self, game)
@@ -40,6 +44,7 @@ class TitleScreenState(engine.system.State):
 
         # Play music, Show the start menu
         self.load_content()
+        self.game.sound_manager.prefetch_music('level_1.wav')
         self.background = self.game.image_manager.get_image('title')
         self.game \
             .menu_manager \
@@ -60,7 +65,7 @@ class TitleScreenState(engine.system.State):
         # update menus only if there is one
         if self.game.menu_manager.has_menu():
             self.game.menu_manager \
-                .get_current_menu().update(pygame.time.get_ticks())
+                .get_current_menu().update(engine.system.get_ticks())
 
         if self.done_exiting:
             self.game.menu_manager.pop_menu()
@@ -84,6 +89,10 @@ class GameState(engine.system.State):
         self.level = game.current_level
         self.game_over_triggered = False
         self.level_complete = False
+        # snapshot of the level as it started, restarts after
+        # a game over restore it instead of loading the level
+        self.checkpoint = None
+        self.last_snapshot = 0 # game time of the last rewind snapshot
 
     def load_content(self):
         # load images
@@ -96,27 +105,53 @@ class GameState(engine.system.State):
         self.game.image_manager.unload_image('background')
 
     def activate(self, transition):
-        engine.system.State.activate(self, transition)
-
         # load all images and sounds for the state
         self.load_content()
 
+        # restarting, put the level back as it was when it started.
+        # The checkpoint holds no timers so the game time carries on
+        checkpoint = self.checkpoint
+        if checkpoint is not None:
+            self.game.snapshots.restore(checkpoint, self, keep_time = True)
+            self.checkpoint = checkpoint
+
+        engine.system.State.activate(self, transition)
+
         # Clear the input manager
         self.game.input_manager.clear()
 
-        # load the level on state activation
-        level_string = 'level_%d.txt' % self.level
-        self.sprite_manager.load_level(self.game, level_string)
+        # load the level on state activation, and take the checkpoint
+        # before the player joins it. Streamed levels read from an open
+        # file, so they can't be captured and are loaded again
+        if checkpoint is None:
+            level_string = 'level_%d.txt' % self.level
+            self.sprite_manager.load_level(self.game, level_string)
+            self.background = self.game.image_manager.get_image('background')
+            self.viewport = engine.graphics.Viewport(self.game, 
+                                                     self.background)
+            if not self.game.stream_levels:
+                self.checkpoint = self.capture(attributes = ())
+        if self.game.rewind is not None:
+            self.game.rewind.clear()
 
         # play music
         music_string = 'level_%d.wav' % self.level
         self.game.sound_manager.play_music(music_string)
 
-        # create player, viewport, score and lives render, 
-        # add player to sprite manager group
+        # read the music that can come up during the level in the
+        # background so switching to it doesn't stall the game
+        self.game.sound_manager.prefetch_music('gameover.wav')
+        self.game.sound_manager.prefetch_music('levelwin.wav')
+        if self.level < 6:
+            self.game.sound_manager.prefetch_music('level_%d.wav' % 
+                                                   (self.level + 1))
+        else:
+            self.game.sound_manager.prefetch_music('bossalert.wav')
+            self.game.sound_manager.prefetch_music('bossmusic.wav', 
+                                                   decode = True)
+
+        # score and lives render, add player to sprite manager group
         self.player = self.game.player
-        self.background = self.game.image_manager.get_image('background')
-        self.viewport = engine.graphics.Viewport(self.game, self.background)
         self.sprite_manager.add_sprite(self.player, 'player_group')
         self.score_render = self.font.render("SCORE " + str(self.player.score),
                                              False, self.text_color)
@@ -138,10 +173,13 @@ class GameState(engine.system.State):
         self.game.sound_manager.music_control('unpause')
 
     def handle_input(self):
+        if self.rewinding():
+            return
+
         # input passed to the player object
         # player.handle_input() returns a bullet sprite if req's are met,
         # none if not.
-        bullets = self.player.handle_input(self.game, pygame.time.get_ticks())
+        bullets = self.player.handle_input(self.game, engine.system.get_ticks())
         for bullet in bullets:
             self.sprite_manager.add_sprite(bullet, 'player_shots')
 
@@ -149,16 +187,56 @@ class GameState(engine.system.State):
         if self.game.input_manager.is_pressed('START'):
             self.game.push_state(PauseState(self.game))
 
+    def rewinding(self):
+        # with rewind on, holding SELECT goes back through the
+        # snapshots instead of playing
+        return self.game.rewind is not None and \
+               self.game.input_manager.is_held('SELECT')
+
+    def rewind(self):
+        # go back to the latest snapshot, or stay put
+        # if the rewind buffer has run out
+        snapshot = self.game.rewind.pop()
+        if snapshot is not None:
+            self.game.snapshots.restore(snapshot, self)
+
+    def save_rewind(self):
+        # snapshot the level every REWIND_INTERVAL, taken at the
+        # end of a step so rewinding to it carries on from the next.
+        # Streamed levels can't be captured
+        if self.sprite_manager.level_stream is not None:
+            return
+        current_time = engine.system.get_ticks()
+        if current_time - self.last_snapshot >= REWIND_INTERVAL:
+            self.last_snapshot = current_time
+            self.game.rewind.push(self.capture())
+
+    def capture(self, attributes = None):
+        # snapshot the level. The spawn table and the checkpoint never
+        # change once made, so they are kept rather than copied
+        constants = [self.sprite_manager.enemy_queue]
+        if self.checkpoint is not None:
+            constants.append(self.checkpoint)
+        return self.game.snapshots.capture(self, constants, attributes)
+
     def update(self):
         #print (self.viewport.level_pos + self.game.game_world.width) / 16
 
         engine.system.State.update(self)
 
+        if self.rewinding():
+            self.rewind()
+            return
+
         # scroll the background
         self.viewport.update()
 
+        # collect the sounds played by sprites and collisions this step,
+        # so a sound triggered several times plays once
+        self.game.sound_manager.begin_events()
+
         # update all sprites
-        self.sprite_manager.update(pygame.time.get_ticks(), self.viewport,
+        self.sprite_manager.update(engine.system.get_ticks(), self.viewport,
                                    self.player.rect)
 
         self.game.hud.update(self.player, self.game)
@@ -166,6 +244,8 @@ class GameState(engine.system.State):
         # check for all collsions, get player death
         player_die = self.sprite_manager.check_collisions(self.player)
 
+        self.game.sound_manager.flush_events()
+
         # Decrement lives on player death (This is not done in the player
         # class because colliding with two sprites at once can result in
         # multiple lives lost)
@@ -173,16 +253,22 @@ class GameState(engine.system.State):
             self.player.lives -= 1
             # if player has lost all lives, push a game over event state
             if self.player.lives == -1:
+                # restart this state from its checkpoint rather than
+                # building a new one and loading the level again
+                if self.checkpoint is not None:
+                    restart = self
+                else:
+                    restart = GameState(self.game)
                 text = ["GAME OVER"]
                 state = engine.objects.EventState(self.game, text, 
-                                                  "gameover.wav",
-                                                  GameState(self.game))
+                                                  "gameover.wav", restart)
                 self.game.reset_player()
                 self.game.push_state(state)
         
         # If player has reached the end of the level, create a
         # level complete message
-        if self.viewport.level_pos > 11500:  
+        level_end = self.sprite_manager.get_level_end()
+        if level_end is not None and self.viewport.level_pos > level_end:
             end = self.game.next_level()
             if not end:  # go to next level
                 text = ["LEVEL %d COMPLETE!" % self.level]
@@ -200,14 +286,13 @@ class GameState(engine.system.State):
                 if self.game.boss_level == True:
                     # spawn boss once
                     if not self.boss_spawned:
-                        self.sprite_manager.sprites['enemy_group'].empty()
-                        self.sprite_manager.sprites['explosions'].empty()
-                        self.sprite_manager.create_enemy(self.game, 
-                                                         'boss',235, 
-                                                         59 + self.game.hud.height, 
-                                                         False)
+                        self.sprite_manager.empty_group('enemy_group')
+                        self.sprite_manager.empty_group('explosions')
+                        self.sprite_manager.queue_boss(self.game, 235,
+                                                       59 + self.game.hud.height)
                         self.boss_spawned = True
-                        self.game.sound_manager.play_music('bossmusic.wav')
+                        self.game.sound_manager.play_music('bossmusic.wav',
+                                                           fade = 1000)
                     elif self.sprite_manager.boss_destoyed():
                         # Boss destroyed, do ending sequence and push a 
                         # TitleScreenState at the end
@@ -241,6 +326,9 @@ class GameState(engine.system.State):
                                                             screen1)
                          self.game.player.reset_pos()
                          self.game.push_state(state)
+
+        if self.game.rewind is not None:
+            self.save_rewind()
            
     def draw(self, screen):
         # draw the background and all sprites
@@ -306,7 +394,7 @@ class PauseState(engine.system.State):
         # update menus only if there is one
         if self.game.menu_manager.has_menu():
             self.game.menu_manager \
-                .get_current_menu().update(pygame.time.get_ticks())
+                .get_current_menu().update(engine.system.get_ticks())
         
         # user has quit to title
         if self.done_exiting:
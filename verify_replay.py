@@ -0,0 +1,192 @@
+#-------------------------------------------------------------------------------
+# Name:        verify_replay.py
+# Purpose:     Plays a recording made with Main.py --record as fast as
+#              possible with no window or sound, hashing the game's state
+#              every few steps. Reports steps per second and the first
+#              step where two runs differ, so it can check a build plays
+#              the same and no slower than another, e.g.
+#              python verify_replay.py session.rec --save build1.txt
+#              python verify_replay.py session.rec --compare build1.txt
+#
+# Author:      Will Taplin
+#
+# Created:     19/12/2011
+# Copyright:   (c) Owner 2011
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+import os
+import sys
+import time
+import random
+import hashlib
+import optparse
+
+# no window or sound needed
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import engine
+import game
+
+def get_objects(manager):
+    # return (kind, x, y, hits) for every sprite and bullet, kind being
+    # its group and x, y its position as floats, sorted. The same
+    # whether an object is a sprite, a bullet engine row or moved by
+    # the motion batch
+    batched = dict() # sprite : its position in the motion batch
+    if manager.motion_batch is not None:
+        batched = manager.motion_batch.get_positions()
+    objects = []
+    for key in manager.sprites:
+        for sprite in manager.sprites[key]:
+            if sprite in batched:
+                x, y = batched[sprite]
+            else:
+                x = getattr(sprite, 'dx', sprite.rect.x)
+                y = getattr(sprite, 'dy', sprite.rect.y)
+            objects.append((key, float(x), float(y),
+                            getattr(sprite, 'hits', None)))
+    bullet_engine = manager.bullet_engine
+    if bullet_engine is not None:
+        for key in bullet_engine.owners:
+            rows = bullet_engine.get_rows(key)
+            for x, y in zip(bullet_engine.x[rows].tolist(),
+                            bullet_engine.y[rows].tolist()):
+                objects.append((key, x, y, None))
+    objects.sort()
+    return objects
+
+def hash_state(new_game):
+    # return a hash of the simulation: the current state, game time,
+    # random numbers, player, scroll position, spawn cursor and every
+    # sprite and bullet
+    state = new_game.get_current_state()
+    player = new_game.player
+    parts = [state.__class__.__name__, new_game.current_level,
+             new_game.boss_level, engine.system.get_ticks(),
+             random.getstate(), player.score, player.lives,
+             player.dx, player.dy]
+    viewport = getattr(state, 'viewport', None)
+    if viewport is not None:
+        parts.append(viewport.level_pos)
+    manager = getattr(state, 'sprite_manager', None)
+    if manager is not None:
+        parts.append(manager.spawn_cursor)
+        parts.extend(get_objects(manager))
+    return hashlib.md5(repr(parts)).hexdigest()[:16]
+
+def run_replay(filename, every, draw = False):
+    # play the recording in filename through to its end. Returns
+    # (hashes, steps per second), hashes being (step, hash) every
+    # every steps and after the last. Only the steps are timed
+    new_game = game.PsmGame()
+    replay = engine.replay.Replay(filename)
+    new_game.play_replay(replay)
+    screen = new_game.display.get_screen()
+    hashes = []
+    elapsed = 0.0
+    while not replay.finished():
+        start = time.time()
+        new_game.step()
+        if draw:
+            for state in new_game.states:
+                state.draw(screen)
+        elapsed += time.time() - start
+        if replay.step % every == 0 or replay.finished():
+            hashes.append((replay.step, hash_state(new_game)))
+    return hashes, len(replay) / max(elapsed, 1e-9)
+
+def first_divergence(hashes, other_hashes):
+    # return the first step whose hashes differ, None if
+    # all the steps hashed in both match
+    other = dict(other_hashes)
+    for step, state_hash in hashes:
+        if step in other and other[step] != state_hash:
+            return step
+    return None
+
+def save_hashes(filename, hashes, speed):
+    results = open(filename, 'w')
+    try:
+        results.write('speed %f\n' % speed)
+        for step, state_hash in hashes:
+            results.write('%d %s\n' % (step, state_hash))
+    finally:
+        results.close()
+
+def load_hashes(filename):
+    # return the (hashes, steps per second) saved to filename
+    results = open(filename, 'r')
+    try:
+        speed = float(results.readline().split()[1])
+        hashes = []
+        for line in results:
+            step, state_hash = line.split()
+            hashes.append((int(step), state_hash))
+    finally:
+        results.close()
+    return hashes, speed
+
+def main():
+    parser = optparse.OptionParser(usage = '%prog [options] recording')
+    parser.add_option('--every', type = 'int', default = 60,
+                      help = 'steps between state hashes')
+    parser.add_option('--runs', type = 'int', default = 2,
+                      help = 'times to play the recording, each run '
+                             'is checked against the first')
+    parser.add_option('--draw', action = 'store_true', default = False,
+                      help = 'draw every step as well')
+    parser.add_option('--save', metavar = 'FILE',
+                      help = 'save the hashes and speed to FILE')
+    parser.add_option('--compare', metavar = 'FILE',
+                      help = 'check against hashes and speed saved '
+                             'by another build')
+    parser.add_option('--max-slowdown', type = 'float', default = 0.1,
+                      help = 'fraction slower than --compare that fails, '
+                             'default 0.1')
+    options, args = parser.parse_args()
+    if len(args) != 1:
+        parser.error('give one recording to play')
+
+    failed = False
+    runs = []
+    for run in xrange(max(options.runs, 1)):
+        try:
+            hashes, speed = run_replay(args[0], options.every, options.draw)
+        except IOError, message:
+            print 'Cannot load replay:', message
+            sys.exit(2)
+        runs.append((hashes, speed))
+        print 'run %d: %d steps, %.0f steps per second' % \
+              (run + 1, hashes[-1][0] if hashes else 0, speed)
+        step = first_divergence(hashes, runs[0][0])
+        if step is not None:
+            print 'run %d differs from run 1 by step %d' % (run + 1, step)
+            failed = True
+    hashes, speed = runs[0]
+    speed = max(run_speed for run_hashes, run_speed in runs)
+
+    if options.compare:
+        other_hashes, other_speed = load_hashes(options.compare)
+        step = first_divergence(hashes, other_hashes)
+        if step is not None:
+            print 'differs from %s by step %d' % (options.compare, step)
+            failed = True
+        else:
+            print 'same states as %s' % options.compare
+        change = speed / other_speed - 1.0
+        print '%.0f steps per second, %+.1f%% against %s' % \
+              (speed, change * 100, options.compare)
+        if change < -options.max_slowdown:
+            print 'slower than allowed (%.0f%%)' % (options.max_slowdown * 100)
+            failed = True
+
+    if options.save:
+        save_hashes(options.save, hashes, speed)
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -29,9 +29,9 @@ class BasicWeapon():
         return shots
 
     def get_bullet(self, player_rect, angle):
-        bullet = bullets.BasicBullet(player_rect.right - 6,
-                                     player_rect.centery, angle,  
-                                     self.bullet_image)
+        bullet = bullets.BasicBullet.create(player_rect.right - 6,
+                                            player_rect.centery, angle,  
+                                            self.bullet_image)
         return bullet
 
     def power_up(self):
@@ -52,9 +52,9 @@ class Spreader(BasicWeapon):
         self.name = "SPREAD"
 
     def get_bullet(self, player_rect, angle):
-        bullet = bullets.SpreaderBullet(player_rect.right - 6,
-                                      player_rect.centery, angle,
-                                      self.bullet_image)
+        bullet = bullets.SpreaderBullet.create(player_rect.right - 6,
+                                             player_rect.centery, angle,
+                                             self.bullet_image)
         return bullet
 
 class ReverseFire(BasicWeapon):
@@ -66,11 +66,13 @@ class ReverseFire(BasicWeapon):
         self.bullet_image = game.image_manager.get_image('pshot')
         self.angles = [0, 140, 220]
         self.name = "REVERSE"
+        bullets.ReverseFireBullet.prepare(game.image_manager,
+                                          self.bullet_image, self.angles)
 
     def get_bullet(self, player_rect, angle):
-        bullet= bullets.ReverseFireBullet(player_rect.right - 24, 
-                                          player_rect.centery, angle,
-                                          self.bullet_image)
+        bullet= bullets.ReverseFireBullet.create(player_rect.right - 24, 
+                                                 player_rect.centery, angle,
+                                                 self.bullet_image)
         return bullet
 
 class Laser(BasicWeapon):